@@ -1 +1,10 @@
 PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+SHOPPING_CART_CHUNK_SIZE = 2000
+IMAGE_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+BASE64_CHUNK_SIZE = 64 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+THROTTLE_LOCK_TIMEOUT = 1
+THROTTLE_LOCK_ATTEMPTS = 50
+THROTTLE_LOCK_DELAY = 0.002
@@ -24,8 +24,9 @@ class RecipeFilter(FilterSet):
     '''
 
     tags = filters.ModelMultipleChoiceFilter(queryset=Tag.objects.all(),
-                                             field_name='tags__slug',
-                                             to_field_name='slug')
+                                             to_field_name='slug',
+                                             method='get_tags')
+    search = filters.CharFilter(method='get_search')
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart')
@@ -34,6 +35,16 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author')
 
+    def get_tags(self, queryset, name, value):
+        if value:
+            return queryset.with_any_tag(value)
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        if value.strip():
+            return queryset.search(value)
+        return queryset
+
     def get_is_favorited(self, queryset, name, value):
         if value:
             return queryset.filter(favorite_recipe__user=self.request.user)
@@ -0,0 +1,24 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ImageUpload
+
+
+class Command(BaseCommand):
+    help = 'Remove expired chunked image uploads'
+
+    def handle(self, *args, **options):
+        expired = timezone.now() - timedelta(hours=settings.UPLOAD_TTL_HOURS)
+        removed = 0
+        for upload in ImageUpload.objects.filter(created__lt=expired):
+            try:
+                os.remove(upload.path)
+            except FileNotFoundError:
+                pass
+            upload.delete()
+            removed += 1
+        self.stdout.write(f'Removed uploads: {removed}')
@@ -0,0 +1,38 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class ImageUpload(models.Model):
+    '''Модель для представления загрузки изображения по частям'''
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             verbose_name='владелец',
+                             related_name='image_uploads')
+    size = models.PositiveIntegerField('размер файла')
+    created = models.DateTimeField('дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+
+    def __str__(self):
+        return str(self.id)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_TEMP_ROOT, str(self.id))
+
+    @property
+    def offset(self):
+        '''Количество уже полученных байт'''
+
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
@@ -1,9 +1,104 @@
-from rest_framework.pagination import PageNumberPagination
+from functools import partial
 
-from .constants import PAGE_SIZE
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from recipes.count_cache import (PAGINATION_PARAMS, estimate_count,
+                                 get_cached_count, get_count_key)
+from .constants import MAX_PAGE_SIZE, PAGE_SIZE
+
+
+class CountPaginator(Paginator):
+    '''Пагинатор Django, получающий количество объектов из функции'''
+
+    def __init__(self, object_list, per_page, get_count=None, **kwargs):
+        self.get_count = get_count
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.get_count is None:
+            return Paginator.count.func(self)
+        return self.get_count()
+
+
+class RecipeCursorPaginator(CursorPagination):
+    '''Курсорный пагинатор рецептов по дате публикации и id'''
+
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+
+
+class SubscriptionCursorPaginator(CursorPagination):
+    '''Курсорный пагинатор подписок по id автора'''
+
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ('id',)
 
 
 class SixPagesPaginator(PageNumberPagination):
-    '''Пагинатор для вывода 6 элементов на странице'''
+    '''
+    Пагинатор для вывода 6 элементов на странице. При параметре
+    pagination=cursor или переданном курсоре переключается на
+    курсорную пагинацию, стоимость которой не зависит от глубины
+    '''
 
     page_size = PAGE_SIZE
+    cursor_paginator_class = None
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        return self.cursor_paginator_class is not None and (
+            request.query_params.get('pagination') == 'cursor'
+            or self.cursor_paginator_class.cursor_query_param
+            in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_paginator_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePaginator(SixPagesPaginator):
+    '''
+    Пагинатор рецептов с поддержкой курсорной пагинации. Количество
+    рецептов кэшируется по набору фильтров, а для анонимного списка
+    без фильтров может оцениваться по статистике Postgres
+    '''
+
+    cursor_paginator_class = RecipeCursorPaginator
+
+    def get_count(self, queryset, request):
+        filtered = any(name not in PAGINATION_PARAMS
+                       for name in request.query_params)
+        if (settings.RECIPE_COUNT_ESTIMATE and not filtered
+                and not request.user.is_authenticated):
+            estimate = estimate_count(queryset.model)
+            if estimate is not None:
+                return estimate
+        return get_cached_count(get_count_key(request), queryset.count)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CountPaginator,
+            get_count=lambda: self.get_count(queryset, request))
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SubscriptionPaginator(SixPagesPaginator):
+    '''Пагинатор подписок с поддержкой курсорной пагинации'''
+
+    cursor_paginator_class = SubscriptionCursorPaginator
@@ -0,0 +1,35 @@
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'ShoppingCartFont'
+FONT_SIZE = 12
+LINE_HEIGHT = 7 * mm
+MARGIN = 20 * mm
+
+
+def render_shopping_cart_pdf(rows, font_path):
+    '''
+    Отрисовывает список покупок в PDF. Модуль не зависит от Django,
+    чтобы функцию можно было выполнять в отдельном процессе
+    '''
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, font_path))
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - MARGIN
+    pdf.setFont(FONT_NAME, FONT_SIZE)
+    for name, unit, amount in rows:
+        if y < MARGIN:
+            pdf.showPage()
+            pdf.setFont(FONT_NAME, FONT_SIZE)
+            y = height - MARGIN
+        pdf.drawString(MARGIN, y, f'{name}, {unit}, {amount}')
+        y -= LINE_HEIGHT
+    pdf.save()
+    return buffer.getvalue()
@@ -1,24 +1,56 @@
-import base64
+import json
+from collections import Counter
 
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
+from recipes.images import get_variant_url
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
                             ShoppingCart, Tag)
-from users.models import Subscribe, User
+from recipes.pantry_index import recipe_changed
+from recipes.shopping_list import update_recipe
+from users.constants import MAX_EMAIL_VALUE
+from users.models import Subscribe, User, normalize_email
+from .constants import IMAGE_MAX_SIZE
+from .models import ImageUpload
+from .uploads import (UPLOAD_PREFIX, check_image_limits, decode_base64_image,
+                      open_upload)
+from .utilities import get_recipes_limit
 
 
 class GetImageBase64(serializers.ImageField):
-    '''Класс метод для управления изображениями в base64'''
+    '''
+    Класс метод для управления изображениями. Принимает файл
+    из multipart запроса, строку base64 или токен загрузки по частям
+    '''
+
+    def __init__(self, *args, variant=None, **kwargs):
+        self.variant = variant
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, value):
+        '''
+        Возвращает адрес уменьшенной копии изображения, если она
+        уже создана, иначе адрес оригинала
+        '''
+        request = self.context.get('request')
+        if self.variant and value:
+            url = get_variant_url(value.name, self.variant)
+            if url:
+                return request.build_absolute_uri(url) if request else url
+        return super().to_representation(value)
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data'):
-            format, string = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(string), name='temp.' + ext)
+            data = decode_base64_image(data)
+        elif isinstance(data, str) and data.startswith(UPLOAD_PREFIX):
+            data = open_upload(data, self.context['request'].user)
+        if hasattr(data, 'size'):
+            check_image_limits(data)
 
         return super().to_internal_value(data)
 
@@ -28,25 +60,47 @@ class BaseUserSerializer(serializers.ModelSerializer):
     Абстрактный класс сериализатора с
     полем аватарки и проверкой наличия подписки
     '''
-    avatar = GetImageBase64(read_only=True)
+    avatar = GetImageBase64(read_only=True, variant='small')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         abstract = True
 
+    def get_subscribed_ids(self):
+        '''
+        Метод возвращающий id авторов, на которых подписан
+        пользователь. Загружается один раз за запрос
+        '''
+        request = self.context.get('request')
+        if not hasattr(request, 'subscribed_ids'):
+            request.subscribed_ids = set(
+                Subscribe.objects.filter(user=request.user).values_list(
+                    'author_id', flat=True))
+        return request.subscribed_ids
+
     def get_is_subscribed(self, obj):
         '''Метод для проверки наличия подписки'''
 
         user = self.context.get('request').user
-        if (user.is_authenticated and Subscribe.objects.filter(
-                user=user, author=obj).exists()):
-            return True
-        return False
+        return user.is_authenticated and obj.id in self.get_subscribed_ids()
+
+
+class NormalizedEmailField(serializers.EmailField):
+    '''Поле почты, приводящее адрес к виду, в котором он хранится'''
+
+    def to_internal_value(self, data):
+        return normalize_email(super().to_internal_value(data))
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     '''Сериализатор для создания пользователя'''
 
+    email = NormalizedEmailField(
+        max_length=MAX_EMAIL_VALUE,
+        validators=(UniqueValidator(
+            queryset=User.objects.all(),
+            message='Пользователь с такой почтой уже существует'),))
+
     class Meta:
         model = User
         fields = (
@@ -141,8 +195,8 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 class ReadRecipeSerializer(serializers.ModelSerializer):
     '''Сериализатор для чтения рецепта'''
 
-    image = GetImageBase64()
-    author = UserReadSerializer()
+    image = GetImageBase64(variant='medium')
+    author = serializers.SerializerMethodField()
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients', many=True)
     tags = TagSerializer(many=True)
@@ -155,23 +209,40 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
 
+    def get_author(self, obj):
+        '''
+        Метод сериализующий автора рецепта. Повторяющиеся
+        на странице авторы сериализуются один раз
+        '''
+        authors = self.context.setdefault('authors', {})
+        if obj.author_id not in authors:
+            authors[obj.author_id] = UserReadSerializer(
+                obj.author, context=self.context).data
+        return authors[obj.author_id]
+
+    def check_user_list(self, obj, model, annotation):
+        '''
+        Метод проверяющий наличие рецепта в списке пользователя.
+        Использует аннотацию из queryset, а при ее отсутствии
+        выполняет отдельный запрос
+        '''
+        user = self.context.get('request').user
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
+        return model.objects.filter(user=user, recipe=obj).exists()
+
     def get_is_favorited(self, obj):
         '''Метод проверяющий наличие рецепта в избранном'''
 
-        return (
-            self.context.get('request').user.is_authenticated
-            and Favorite.objects.filter(user=self.context['request'].user,
-                                        recipe=obj).exists()
-        )
+        return self.check_user_list(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
         '''Метод проверяющий наличие рецепта в списке покупок'''
 
-        return (self.context.get('request').user.is_authenticated
-                and ShoppingCart.objects.filter(
-                    user=self.context['request'].user,
-                    recipe=obj).exists()
-                )
+        return self.check_user_list(
+            obj, ShoppingCart, 'is_in_shopping_cart')
 
 
 class CreateIngredientToRecipe(serializers.ModelSerializer):
@@ -203,19 +274,52 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         fields = ('ingredients', 'tags', 'image',
                   'name', 'text', 'cooking_time', 'author')
 
+    def to_internal_value(self, data):
+        if hasattr(data, 'getlist'):
+            values = data.dict()
+            if 'tags' in data:
+                values['tags'] = data.getlist('tags')
+            if 'ingredients' in data:
+                try:
+                    values['ingredients'] = json.loads(data['ingredients'])
+                except ValueError:
+                    raise serializers.ValidationError({
+                        'ingredients': 'Ожидается список ингредиентов в JSON'})
+            data = values
+        return super().to_internal_value(data)
+
+    def validate_ingredients(self, value):
+        '''Метод проверяющий ингредиенты одним запросом к базе'''
+
+        if not value:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один ингредиент')
+        ids = [ingredient['id'] for ingredient in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться')
+        existing = set(Ingredient.objects.filter(id__in=ids).values_list(
+            'id', flat=True))
+        missing = [pk for pk in ids if pk not in existing]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {missing}')
+        return value
+
     def create_tag_and_ingredient(self, recipe, tags, ingredients):
         '''
         Метод для создания записей в модели
         тегов рецепта и ингредиентов рецепта
         '''
         recipe.tags.set(tags)
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe,
+                              ingredient_id=ingredient['id'],
+                              amount=ingredient['amount'])
+            for ingredient in ingredients
+        )
 
-        for ingredient in ingredients:
-            ingredient_obj = Ingredient.objects.get(id=ingredient['id'])
-            RecipeIngredients.objects.create(amount=ingredient['amount'],
-                                             recipe=recipe,
-                                             ingredient=ingredient_obj)
-
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -226,37 +330,91 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        '''
+        Метод для обновления ингредиентов рецепта по разнице между
+        сохраненными и переданными значениями. Возвращает
+        количества ингредиентов до и после изменения
+        '''
+        submitted = {ingredient['id']: ingredient['amount']
+                     for ingredient in ingredients}
+        stored = {}
+        to_delete = []
+        old_amounts = Counter()
+        for row in RecipeIngredients.objects.filter(recipe=recipe):
+            old_amounts[row.ingredient_id] += row.amount
+            if row.ingredient_id in stored or (
+                    row.ingredient_id not in submitted):
+                to_delete.append(row.id)
+            else:
+                stored[row.ingredient_id] = row
+
+        to_update = []
+        for pk, row in stored.items():
+            if row.amount != submitted[pk]:
+                row.amount = submitted[pk]
+                to_update.append(row)
+        if to_delete:
+            RecipeIngredients.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredients.objects.bulk_update(to_update, ('amount',))
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in submitted.items() if pk not in stored
+        )
+        return old_amounts, Counter(submitted)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        instance.image = validated_data.get(
-            'image', instance.image)
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        RecipeIngredients.objects.filter(
-            recipe=instance,
-            ingredient__in=instance.ingredients.all()).delete()
-        instance.save()
-        self.create_tag_and_ingredient(instance, tags, ingredients)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if field == 'image' or getattr(instance, field) != value
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if changed_fields or tags is not None or ingredients is not None:
+            instance.save(update_fields=changed_fields)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            update_recipe(instance,
+                          *self.update_ingredients(instance, ingredients))
+            recipe_changed(instance.pk)
         return instance
 
     def to_representation(self, instance):
-
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user).get(pk=instance.pk)
         serializer = ReadRecipeSerializer(
             instance,
             context={
-                'request': self.context.get('request')
+                'request': request
             }
         )
         return serializer.data
 
 
+class PantryRecipeSerializer(ReadRecipeSerializer):
+    '''
+    Сериализатор рецепта, подобранного по имеющимся ингредиентам,
+    с числом совпавших и недостающих ингредиентов
+    '''
+
+    matched_ingredients = serializers.ReadOnlyField()
+    missing_ingredients = serializers.ReadOnlyField()
+
+    class Meta(ReadRecipeSerializer.Meta):
+        fields = (*ReadRecipeSerializer.Meta.fields,
+                  'matched_ingredients', 'missing_ingredients')
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     '''Сериализатор для краткой информации о рецепте'''
 
-    image = GetImageBase64()
+    image = GetImageBase64(variant='small')
 
     class Meta:
         model = Recipe
@@ -267,7 +425,7 @@ class SubscribeSerializer(BaseUserSerializer):
     '''Сериализатор для чтения подписок'''
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField(source='recipe_author')
+    recipes_count = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
     email = serializers.ReadOnlyField()
     first_name = serializers.ReadOnlyField()
@@ -279,20 +437,14 @@ class SubscribeSerializer(BaseUserSerializer):
                   'first_name', 'last_name',
                   'recipes', 'avatar', 'recipes_count', 'is_subscribed')
 
-    def get_recipes_count(self, obj):
-        '''Метод для получения солличества рецептов автора'''
-
-        return obj.recipe_author.count()
-
     def get_recipes(self, obj):
-        '''Метод для ограничения колличества рецептов на странице'''
-
-        request = self.context.get('request')
-        limit = request.data.get('recipes_limit')
-        recipes = obj.recipe_author.all()
+        '''Метод для ограничения количества рецептов на странице'''
 
-        if limit:
-            recipes = recipes[:limit]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipe_author.all()[:limit]
         return RecipeSerializer(recipes, many=True).data
 
 
@@ -317,8 +469,36 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         subscribe = Subscribe.objects.create(**validated_data)
+        request = self.context.get('request')
+        if hasattr(request, 'subscribed_ids'):
+            request.subscribed_ids.add(subscribe.author_id)
         return subscribe
 
     def to_representation(self, instance):
         serializer = SubscribeSerializer(instance.author, context=self.context)
         return serializer.data
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    '''Сериализатор для загрузки изображения по частям'''
+
+    offset = serializers.ReadOnlyField()
+    token = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'size', 'offset', 'token')
+
+    def validate_size(self, value):
+        if value > IMAGE_MAX_SIZE:
+            raise serializers.ValidationError('Слишком большое изображение')
+        return value
+
+    def get_token(self, obj):
+        '''Метод возвращающий токен для передачи в поле изображения'''
+
+        return f'{UPLOAD_PREFIX}{obj.id}'
+
+    def create(self, validated_data):
+        return ImageUpload.objects.create(
+            user=self.context['request'].user, **validated_data)
@@ -0,0 +1,223 @@
+import base64
+import json
+import time
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from api import uploads
+from api.pagination import RecipePaginator
+from api.throttling import BucketStorage, CacheBucketStorage
+from recipes.models import (Ingredient, Recipe, RecipeIngredients,
+                            RecipeTags, ShoppingListIngredient, Tag)
+from users.models import User
+
+RECIPES_COUNT = 100
+LIST_QUERIES = 5
+RETRIEVE_QUERIES = 4
+
+
+class RecipeQueriesTest(TestCase):
+    '''
+    Проверяет, что чтение рецептов выполняется фиксированным
+    числом запросов независимо от размера страницы
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password', first_name='Reader', last_name='Test')
+        authors = [
+            User.objects.create(username=f'author{index}',
+                                email=f'author{index}@example.com',
+                                first_name='Author', last_name='Test')
+            for index in range(3)
+        ]
+        tags = [Tag.objects.create(name=f'tag{index}', slug=f'tag{index}')
+                for index in range(3)]
+        ingredients = [
+            Ingredient.objects.create(name=f'ingredient{index}',
+                                      measurement_unit='г')
+            for index in range(10)
+        ]
+        Recipe.objects.bulk_create(
+            Recipe(author=authors[index % len(authors)],
+                   name=f'recipe{index}', image='recipe_images/test.png',
+                   text='text', cooking_time=10)
+            for index in range(RECIPES_COUNT))
+        recipes = list(Recipe.objects.order_by('id'))
+        RecipeTags.objects.bulk_create(
+            RecipeTags(recipe=recipe, tag=tags[index % len(tags)])
+            for index, recipe in enumerate(recipes))
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe,
+                              ingredient=ingredients[(index + shift)
+                                                     % len(ingredients)],
+                              amount=10)
+            for index, recipe in enumerate(recipes) for shift in range(3))
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_page_of_six(self):
+        with self.assertNumQueries(LIST_QUERIES):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_list_page_of_hundred(self):
+        with mock.patch.object(RecipePaginator, 'page_size', RECIPES_COUNT):
+            with self.assertNumQueries(LIST_QUERIES):
+                response = self.client.get('/api/recipes/')
+        self.assertEqual(len(response.json()['results']), RECIPES_COUNT)
+
+    def test_retrieve(self):
+        with self.assertNumQueries(RETRIEVE_QUERIES):
+            response = self.client.get(
+                f'/api/recipes/{self.recipe.id}/',
+                HTTP_REFERER=f'http://testserver/recipes/{self.recipe.id}')
+        self.assertEqual(len(response.json()['ingredients']), 3)
+
+
+class RecipeMultipartUpdateTest(TestCase):
+    '''
+    Проверяет частичное обновление рецепта multipart-запросом:
+    непереданные теги и ингредиенты остаются без изменений
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Author', last_name='Test')
+        cls.tag = Tag.objects.create(name='завтрак', slug='breakfast')
+        cls.milk = Ingredient.objects.create(name='молоко',
+                                             measurement_unit='мл')
+        cls.flour = Ingredient.objects.create(name='мука',
+                                              measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='блины', image='recipe_images/test.png',
+            text='text', cooking_time=10)
+        cls.recipe.tags.set((cls.tag,))
+        RecipeIngredients.objects.create(recipe=cls.recipe,
+                                         ingredient=cls.milk, amount=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch(self, data):
+        return self.client.patch(f'/api/recipes/{self.recipe.id}/', data,
+                                 format='multipart')
+
+    def test_name_only(self):
+        response = self.patch({'name': 'оладьи'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'оладьи')
+        self.assertEqual(list(self.recipe.tags.all()), [self.tag])
+        self.assertEqual(list(self.recipe.ingredients.all()), [self.milk])
+
+    def test_ingredients_without_tags(self):
+        response = self.patch({'ingredients': json.dumps(
+            [{'id': self.flour.id, 'amount': 200}])})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(list(self.recipe.tags.all()), [self.tag])
+        self.assertEqual(list(self.recipe.ingredients.all()), [self.flour])
+
+
+class ShoppingCartPDFTest(TestCase):
+    '''
+    Проверяет выгрузку списка покупок в PDF: ошибки рендеринга
+    возвращаются кодом ответа, а не обрезанным файлом
+    '''
+
+    url = '/api/recipes/download_shopping_cart/?format=pdf'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com',
+            password='password', first_name='Buyer', last_name='Test')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        ShoppingListIngredient.objects.create(user=cls.user, ingredient=milk,
+                                              amount=500)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pdf(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    @mock.patch('api.views.shopping_cart_pdf',
+                side_effect=futures.TimeoutError)
+    def test_timeout(self, shopping_cart_pdf):
+        self.assertEqual(self.client.get(self.url).status_code, 504)
+
+    @mock.patch('api.views.shopping_cart_pdf', side_effect=BrokenProcessPool)
+    def test_broken_pool(self, shopping_cart_pdf):
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+
+
+class DecodeBase64ImageTest(SimpleTestCase):
+    '''Проверяет декодирование изображения из base64 по частям'''
+
+    content = bytes(range(256)) * 20
+
+    def decode(self, string):
+        file = uploads.decode_base64_image(f'data:image/png;base64,{string}')
+        with file:
+            return file.read()
+
+    def test_wrapped_lines(self):
+        string = base64.encodebytes(self.content).decode()
+        self.assertIn('\n', string)
+        for chunk_size in (7, 64, 1000, 64 * 1024):
+            with self.subTest(chunk_size=chunk_size), mock.patch.object(
+                    uploads, 'BASE64_CHUNK_SIZE', chunk_size):
+                self.assertEqual(self.decode(string), self.content)
+
+    def test_invalid(self):
+        with self.assertRaises(serializers.ValidationError):
+            self.decode('abc*')
+
+
+class CacheBucketStorageTest(SimpleTestCase):
+    '''
+    Проверяет, что одновременные запросы из разных потоков не
+    забирают из общей корзины больше токенов, чем в ней есть
+    '''
+
+    def setUp(self):
+        cache.clear()
+
+    def test_abstract_storage(self):
+        with self.assertRaises(TypeError):
+            BucketStorage()
+
+    def test_concurrent_consume(self):
+        storage = CacheBucketStorage()
+        get = storage.get
+
+        def slow_get(key):
+            bucket = get(key)
+            time.sleep(0.01)
+            return bucket
+
+        with mock.patch.object(storage, 'get', slow_get):
+            with futures.ThreadPoolExecutor(max_workers=10) as executor:
+                results = list(executor.map(
+                    lambda _: storage.consume('throttle', 5, 0.001),
+                    range(20)))
+        self.assertEqual(sum(allowed for allowed, _ in results), 5)
@@ -0,0 +1,130 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import ScopedRateThrottle
+
+from .constants import (THROTTLE_LOCK_ATTEMPTS, THROTTLE_LOCK_DELAY,
+                        THROTTLE_LOCK_TIMEOUT)
+
+DEFAULT_BACKEND = 'api.throttling.CacheBucketStorage'
+
+
+class BucketStorage(ABC):
+    '''
+    Хранилище корзин токенов. Корзина хранится парой
+    (количество токенов, время последнего пополнения). Наследники
+    должны сделать consume атомарным для одного ключа
+    '''
+
+    @abstractmethod
+    def get(self, key):
+        '''Возвращает корзину по ключу или None'''
+
+    @abstractmethod
+    def set(self, key, bucket, timeout):
+        '''Сохраняет корзину на timeout секунд'''
+
+    def consume(self, key, capacity, rate):
+        '''
+        Пополняет корзину со скоростью rate токенов в секунду, но не
+        больше capacity, и забирает из нее один токен. Возвращает пару
+        (разрешен ли запрос, сколько секунд ждать следующего токена)
+        '''
+        now = time.time()
+        tokens, updated = self.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.set(key, (tokens, now), math.ceil(capacity / rate))
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class MemoryBucketStorage(BucketStorage):
+    '''Хранилище в памяти процесса, подходит для тестов и отладки'''
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = Lock()
+
+    def get(self, key):
+        return self.buckets.get(key)
+
+    def set(self, key, bucket, timeout):
+        self.buckets[key] = bucket
+
+    def consume(self, key, capacity, rate):
+        with self.lock:
+            return super().consume(key, capacity, rate)
+
+
+class CacheBucketStorage(BucketStorage):
+    '''
+    Хранилище в общем кэше Django, общее для всех процессов.
+    Корзина читается и записывается под блокировкой: ключ блокировки
+    создается атомарной операцией cache.add и сам истекает, если
+    процесс упал, не сняв ее. Если блокировку не удалось получить,
+    запрос отклоняется
+    '''
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, bucket, timeout):
+        self.cache.set(key, bucket, timeout)
+
+    def consume(self, key, capacity, rate):
+        lock = f'{key}:lock'
+        for _ in range(THROTTLE_LOCK_ATTEMPTS):
+            if self.cache.add(lock, 1, THROTTLE_LOCK_TIMEOUT):
+                try:
+                    return super().consume(key, capacity, rate)
+                finally:
+                    self.cache.delete(lock)
+            time.sleep(THROTTLE_LOCK_DELAY)
+        return False, 1 / rate
+
+
+@lru_cache(maxsize=None)
+def get_storage(path):
+    '''Возвращает хранилище корзин по пути к его классу'''
+
+    return import_string(path)()
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    '''
+    Ограничение частоты запросов корзиной токенов. Область задается
+    атрибутом представления throttle_scope, а для отдельных действий
+    набора представлений — словарем throttle_scopes. Скорость
+    '10/min' означает корзину на 10 запросов, которая полностью
+    пополняется за минуту. Хранилище задается ключом THROTTLE_BACKEND
+    в settings.REST_FRAMEWORK
+    '''
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None),
+            getattr(view, self.scope_attr, None))
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        storage = get_storage(settings.REST_FRAMEWORK.get(
+            'THROTTLE_BACKEND', DEFAULT_BACKEND))
+        allowed, self.retry_after = storage.consume(
+            self.get_cache_key(request, view), self.num_requests,
+            self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
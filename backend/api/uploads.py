@@ -0,0 +1,150 @@
+import base64
+import binascii
+import os
+import tempfile
+import weakref
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image
+from rest_framework import serializers
+
+from .constants import (BASE64_CHUNK_SIZE, IMAGE_MAX_PIXELS, IMAGE_MAX_SIZE,
+                        UPLOAD_CHUNK_SIZE)
+from .models import ImageUpload
+
+UPLOAD_PREFIX = 'upload:'
+BASE64_WHITESPACE = ' \t\n\r\x0b\x0c'
+
+
+class StoredUpload(File):
+    '''
+    Файл завершенной загрузки. Путь к нему позволяет Django
+    переместить файл в хранилище без копирования в память
+    '''
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class TemporaryImage(StoredUpload):
+    '''
+    Временный файл изображения. Удаляется при сборке мусора,
+    если хранилище не переместило его
+    '''
+
+    def __init__(self, file, name):
+        super().__init__(file, name)
+        weakref.finalize(self, remove_file, file.name)
+
+
+def remove_file(path):
+    '''Удаляет файл, если он еще существует'''
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def iter_base64_chunks(string):
+    '''
+    Перебирает части строки base64 без пробельных символов.
+    Длина каждой части, кроме последней, кратна четырем, поэтому
+    части можно декодировать независимо даже при переносах строк
+    '''
+    whitespace = str.maketrans('', '', BASE64_WHITESPACE)
+    rest = ''
+    for start in range(0, len(string), BASE64_CHUNK_SIZE):
+        chunk = rest + string[start:start + BASE64_CHUNK_SIZE].translate(
+            whitespace)
+        size = len(chunk) - len(chunk) % 4
+        yield chunk[:size]
+        rest = chunk[size:]
+    if rest:
+        yield rest
+
+
+def decode_base64_image(data):
+    '''
+    Декодирует изображение из base64 во временный файл по частям,
+    не создавая в памяти полную копию декодированных данных.
+    Пробельные символы и переносы строк пропускаются
+    '''
+    header, string = data.split(';base64,')
+    ext = header.split('/')[-1]
+    length = len(string) - sum(string.count(char)
+                               for char in BASE64_WHITESPACE)
+    if length * 3 // 4 > IMAGE_MAX_SIZE:
+        raise serializers.ValidationError('Слишком большое изображение')
+    fd, path = tempfile.mkstemp(suffix=f'.upload.{ext}',
+                                dir=settings.FILE_UPLOAD_TEMP_DIR)
+    os.close(fd)
+    file = TemporaryImage(open(path, 'w+b'), name=f'temp.{ext}')
+    try:
+        for chunk in iter_base64_chunks(string):
+            file.write(base64.b64decode(chunk, validate=True))
+    except (binascii.Error, ValueError):
+        raise serializers.ValidationError('Некорректная строка base64')
+    file.seek(0)
+    return file
+
+
+def open_upload(data, user):
+    '''Возвращает файл завершенной загрузки пользователя по токену'''
+
+    try:
+        upload = ImageUpload.objects.get(
+            id=data[len(UPLOAD_PREFIX):], user=user)
+    except (ImageUpload.DoesNotExist, ValidationError):
+        raise serializers.ValidationError('Загрузка не найдена')
+    if upload.offset != upload.size:
+        raise serializers.ValidationError('Загрузка не завершена')
+    try:
+        with Image.open(upload.path) as image:
+            ext = image.format.lower()
+    except (OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError('Загрузите корректное изображение')
+    return StoredUpload(open(upload.path, 'rb'), name=f'{upload.id}.{ext}')
+
+
+def check_image_limits(file):
+    '''
+    Проверяет размер файла и количество пикселей по заголовку
+    изображения, не декодируя его полностью
+    '''
+    if file.size is not None and file.size > IMAGE_MAX_SIZE:
+        raise serializers.ValidationError('Слишком большое изображение')
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError(
+            'Загрузите корректное изображение')
+    finally:
+        file.seek(0)
+    if width * height > IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            'Слишком большое разрешение изображения')
+
+
+def write_chunk(upload, offset, stream):
+    '''
+    Дописывает часть загрузки из потока запроса, начиная с offset.
+    Возвращает False, если offset не совпадает с полученным размером
+    '''
+    if offset != upload.offset:
+        return False
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    with open(upload.path, 'ab') as file:
+        while stream is not None:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if file.tell() + len(chunk) > upload.size:
+                file.truncate(offset)
+                raise serializers.ValidationError(
+                    'Размер данных превышает заявленный')
+            file.write(chunk)
+    return True
@@ -11,8 +11,11 @@ router.register(r'tags', views.TagViewSet, basename='tags')
 router.register(r'users', views.UserViewSet, basename='users')
 router.register(
     r'ingredients', views.IngredientsViewSet, basename='ingredients')
+router.register(r'uploads', views.ImageUploadViewSet, basename='uploads')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('auth/token/login/', views.ThrottledTokenCreateView.as_view(),
+         name='login'),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,9 +1,103 @@
-def create_shopping_cart_txt(ingredients):
-    shopping_cart_txt = ''
-    for ingredient in ingredients:
-        shopping_cart_txt += (
-            f'{ingredient["ingredient__name"]}, '
-            f'{ingredient["ingredient__measurement_unit"]}, '
-            f'{ingredient["final_sum"]} \n'
-        )
-    return shopping_cart_txt
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from recipes.models import Recipe
+from .pdf import render_shopping_cart_pdf
+
+pdf_executor = None
+
+
+def get_recipes_limit(request):
+    '''Возвращает ограничение количества рецептов из параметров запроса'''
+
+    limit = request.query_params.get('recipes_limit')
+    if limit is not None and limit.isdigit():
+        return int(limit)
+    return None
+
+
+def get_ingredient_ids(request):
+    '''
+    Возвращает id ингредиентов из параметра ingredients. Параметр
+    можно передать несколько раз или через запятую
+    '''
+    return {int(value)
+            for values in request.query_params.getlist('ingredients')
+            for value in values.split(',') if value.strip().isdigit()}
+
+
+def set_recipes_preview(authors, limit):
+    '''
+    Загружает последние рецепты для страницы авторов
+    одним запросом и сохраняет их в атрибуте recipes_preview
+    '''
+    authors = {author.id: author for author in authors}
+    for author in authors.values():
+        author.recipes_preview = []
+    for recipe in Recipe.objects.filter(
+            author_id__in=authors).latest_by_author(limit):
+        authors[recipe.author_id].recipes_preview.append(recipe)
+
+
+class Echo:
+    '''Псевдобуфер, возвращающий записанную строку'''
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_txt(ingredients):
+    '''Построчно формирует список покупок в текстовом формате'''
+
+    for name, unit, amount in ingredients:
+        yield f'{name}, {unit}, {amount} \n'
+
+
+def shopping_cart_csv(ingredients):
+    '''Построчно формирует список покупок в формате CSV'''
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for row in ingredients:
+        yield writer.writerow(row)
+
+
+def get_pdf_executor():
+    '''
+    Возвращает пул процессов для рендеринга PDF. Процессы
+    запускаются через spawn: fork процесса gunicorn с работающими
+    потоками пула уменьшенных копий изображений может привести
+    к взаимной блокировке
+    '''
+    global pdf_executor
+    if pdf_executor is None:
+        pdf_executor = ProcessPoolExecutor(
+            max_workers=settings.SHOPPING_CART_PDF_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'))
+    return pdf_executor
+
+
+def shopping_cart_pdf(ingredients):
+    '''
+    Формирует список покупок в формате PDF в пуле процессов,
+    не нагружая процессорным рендерингом поток запроса.
+    Возвращает содержимое файла целиком, чтобы ошибка рендеринга
+    превратилась в ответ с ошибкой, а не в обрезанный файл.
+    Вызывает TimeoutError по истечении SHOPPING_CART_PDF_TIMEOUT
+    и BrokenProcessPool при аварийном завершении процесса пула
+    '''
+    global pdf_executor
+    future = get_pdf_executor().submit(
+        render_shopping_cart_pdf, list(ingredients),
+        settings.SHOPPING_CART_PDF_FONT)
+    try:
+        return future.result(timeout=settings.SHOPPING_CART_PDF_TIMEOUT)
+    except BrokenProcessPool:
+        pdf_executor = None
+        raise
+    finally:
+        future.cancel()
@@ -1,25 +1,47 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets
+from djoser.views import TokenCreateView
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from users.models import Subscribe, User
+from .constants import SHOPPING_CART_CHUNK_SIZE
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import SixPagesPaginator
+from .models import ImageUpload
+from .pagination import (RecipePaginator, SixPagesPaginator,
+                         SubscriptionPaginator)
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, TextRenderer
 from .serializers import (CreateRecipeSerializer, CustomUserCreateSerializer,
-                          IngredientSerializer, ReadRecipeSerializer,
-                          RecipeSerializer, SetPasswordSerializer,
+                          ImageUploadSerializer, IngredientSerializer,
+                          PantryRecipeSerializer, ReadRecipeSerializer,
+                          RecipeSerializer,
+                          SetPasswordSerializer,
                           SetUserAvatarSerializer, SubscribeCreateSerializer,
                           SubscribeSerializer, TagSerializer,
                           UserReadSerializer)
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
-                            ShoppingCart, Tag)
-from .utilities import create_shopping_cart_txt
+from recipes.constants import SIMILARITY_TOP_K
+from recipes.ingredient_catalog import get_manifest
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListIngredient, Tag)
+from recipes.pantry_index import pantry_index
+from .uploads import write_chunk
+from .utilities import (get_ingredient_ids, get_recipes_limit,
+                        set_recipes_preview, shopping_cart_csv,
+                        shopping_cart_pdf,
+                        shopping_cart_txt)
+
+SHOPPING_CART_FORMATS = {
+    'txt': shopping_cart_txt,
+    'csv': shopping_cart_csv,
+}
 
 
 def manage_list_item(request, recipe, user,
@@ -57,6 +79,24 @@ class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     search_fields = ('^name',)
+    throttle_scope = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search')
+        if search:
+            return Response(ingredient_index.fuzzy_search(search))
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
+    @action(methods=['GET'], detail=False)
+    def version(self, request):
+        '''
+        Метод для получения текущей версии выгрузки каталога,
+        по которой клиент решает, нужно ли скачивать его заново
+        '''
+        return Response(get_manifest())
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -64,9 +104,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = SixPagesPaginator
+    pagination_class = RecipePaginator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    throttle_scope = 'recipes'
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'download_shopping_cart': 'shopping_cart',
+    }
+
+    def get_queryset(self):
+        queryset = Recipe.objects.with_user_flags(self.request.user)
+        if self.action in ('list', 'retrieve'):
+            return queryset.with_related()
+        return queryset
 
     def retrieve(self, request, *args, **kwargs):
         url = request.META.get('HTTP_REFERER').strip('/').split('/')
@@ -107,6 +160,48 @@ class RecipeViewSet(viewsets.ModelViewSet):
             error_message='Рецепт уже добавлен в список покупок',
             delete_message='Рецепт успешно удален из списка покупок')
 
+    @action(methods=['GET'], detail=False, url_path='by-ingredients',
+            pagination_class=SixPagesPaginator)
+    def by_ingredients(self, request):
+        '''
+        Метод для подбора рецептов по имеющимся ингредиентам.
+        Сначала идут рецепты, для которых есть все ингредиенты,
+        затем — по убыванию числа совпавших и возрастанию числа
+        недостающих
+        '''
+        ingredient_ids = get_ingredient_ids(request)
+        if not ingredient_ids:
+            return Response(
+                {'ingredients': ['Нужно указать хотя бы один ингредиент']},
+                status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(pantry_index.match(ingredient_ids))
+        recipes = Recipe.objects.with_related().with_user_flags(
+            request.user).in_bulk([pk for pk, _, _ in page])
+        results = []
+        for pk, matched, missing in page:
+            if pk in recipes:
+                recipe = recipes[pk]
+                recipe.matched_ingredients = matched
+                recipe.missing_ingredients = missing
+                results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, **kwargs):
+        '''
+        Метод для получения похожих рецептов, заранее рассчитанных
+        командой build_similar_recipes
+        '''
+        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
+        queryset = Recipe.objects.with_related().with_user_flags(
+            request.user).filter(similar_to__recipe=recipe).order_by(
+            '-similar_to__score')[:SIMILARITY_TOP_K]
+        serializer = ReadRecipeSerializer(
+            queryset, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(methods=['GET'], detail=True, url_path='get-link')
     def get_link(self, request, **kwargs):
         '''Метод для получения ссылки на страницу рецепта'''
@@ -114,18 +209,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response({'short-link': url})
 
     @action(methods=['GET'], detail=False,
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(TextRenderer, CSVRenderer, PDFRenderer))
     def download_shopping_cart(self, request):
-        '''Метод для скачивания списка покупок через txt файл'''
-
-        ingredients = RecipeIngredients.objects.filter(
-            recipe__shoppingcart_recipe__user=request.user
-        ).values(
+        '''
+        Метод для скачивания списка покупок в формате txt, csv или pdf,
+        выбираемом параметром format. Текстовые форматы отдаются
+        потоком, PDF рендерится до отправки заголовков, чтобы ошибка
+        рендеринга вернулась кодом ответа
+        '''
+        renderer = request.accepted_renderer
+        ingredients = ShoppingListIngredient.objects.filter(
+            user=request.user
+        ).values_list(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(final_sum=Sum('amount'))
-        shopping_cart_txt = create_shopping_cart_txt(ingredients)
-        return HttpResponse(shopping_cart_txt, content_type='text/plain')
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by(
+            'ingredient__name').iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+        if renderer.format == 'pdf':
+            try:
+                response = HttpResponse(shopping_cart_pdf(ingredients),
+                                        content_type=renderer.media_type)
+            except futures.TimeoutError:
+                return Response(
+                    {'detail': 'Не удалось сформировать PDF вовремя'},
+                    status=status.HTTP_504_GATEWAY_TIMEOUT)
+            except BrokenProcessPool:
+                return Response(
+                    {'detail': 'Сервис формирования PDF недоступен'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        else:
+            response = StreamingHttpResponse(
+                SHOPPING_CART_FORMATS[renderer.format](ingredients),
+                content_type=renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"')
+        return response
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    '''
+    Представление для загрузки изображений по частям. Клиент создает
+    загрузку с размером файла, отправляет части запросами PATCH
+    с заголовком Upload-Offset и передает полученный токен
+    в поле изображения рецепта или аватара
+    '''
+
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = 'uploads'
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
+
+    def partial_update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        offset = request.headers.get('Upload-Offset', '')
+        if not offset.isdigit() or not write_chunk(
+                upload, int(offset), request.stream):
+            return Response({'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(upload).data)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -133,6 +280,10 @@ class UserViewSet(viewsets.ModelViewSet):
 
     queryset = User.objects.all()
     pagination_class = SixPagesPaginator
+    throttle_scopes = {
+        'create': 'auth',
+        'set_password': 'auth',
+    }
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -158,7 +309,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
         if request.method == 'PUT':
             serializer = SetUserAvatarSerializer(
-                request.user, data=request.data)
+                request.user, data=request.data, context={'request': request})
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
             return Response(serializer.data, status=status.HTTP_204_NO_CONTENT)
@@ -205,12 +356,20 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(methods=['GET'], detail=False,
             permission_classes=(IsAuthenticated,),
-            pagination_class=SixPagesPaginator)
+            pagination_class=SubscriptionPaginator)
     def subscriptions(self, request):
         '''Метод для получения списка подписок'''
 
-        queryset = User.objects.filter(author__user=request.user)
+        queryset = User.objects.filter(
+            author__user=request.user).order_by('id')
         page = self.paginate_queryset(queryset)
+        set_recipes_preview(page, get_recipes_limit(request))
         serializer = SubscribeSerializer(page, many=True,
                                          context={'request': request})
         return self.get_paginated_response(serializer.data)
+
+
+class ThrottledTokenCreateView(TokenCreateView):
+    '''Представление для получения токена с ограничением частоты'''
+
+    throttle_scope = 'auth'
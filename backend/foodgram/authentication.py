@@ -1,15 +1,144 @@
+import copy
+import time
+import uuid
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import normalize_email
 
 User = get_user_model()
 
+TOKEN_STAMP_KEY = 'auth:token:{}:stamp'
+TOKEN_USER_KEY = 'auth:token:{}:user'
+
 
 class EmailBackend(ModelBackend):
-    def authenticate(self, request, username, password, **kwargs):
+    '''
+    Аутентификация по адресу почты без учета регистра.
+    Адрес нормализуется так же, как при сохранении, поэтому
+    поиск идет по уникальному индексу
+    '''
+
+    def authenticate(self, request, username=None, password=None,
+                     email=None, **kwargs):
+        email = email or username
+        if email is None or password is None:
+            return None
         try:
-            user = User.objects.get(email=username)
+            user = User.objects.get(email=normalize_email(email))
         except User.DoesNotExist:
+            User().set_password(password)
             return None
-        if user.check_password(password):
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+
+class TokenCache:
+    '''
+    Двухуровневый кэш соответствия токена пользователю.
+    Первый уровень — ограниченный LRU в памяти процесса, второй —
+    общий кэш Django. Запись первого уровня действительна, пока
+    в общем кэше лежит та же метка; удаление метки отзывает токен
+    во всех процессах сразу
+    '''
+
+    def __init__(self, size=None, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        '''Возвращает пользователя токена или None, если его нет в кэше'''
+
+        stamp = cache.get(TOKEN_STAMP_KEY.format(key))
+        if stamp is None:
+            self.discard(key)
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            entry_stamp, user, expires = entry
+            if entry_stamp == stamp and expires > time.monotonic():
+                return user
+        shared = cache.get(TOKEN_USER_KEY.format(key))
+        if shared is None or shared[0] != stamp:
+            return None
+        self.remember(key, stamp, shared[1])
+        return shared[1]
+
+    def set(self, key, user):
+        '''Сохраняет пользователя токена на обоих уровнях кэша'''
+
+        ttl = self.ttl or settings.TOKEN_CACHE_TTL
+        stamp = uuid.uuid4().hex
+        cache.set_many({TOKEN_STAMP_KEY.format(key): stamp,
+                        TOKEN_USER_KEY.format(key): (stamp, user)}, ttl)
+        self.remember(key, stamp, user)
+
+    def remember(self, key, stamp, user):
+        '''Сохраняет запись в LRU процесса, вытесняя самые старые'''
+
+        ttl = self.ttl or settings.TOKEN_CACHE_TTL
+        with self.lock:
+            self.entries[key] = (stamp, user, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > (self.size or settings.TOKEN_CACHE_SIZE):
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        '''Удаляет запись из LRU процесса'''
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate(self, *keys):
+        '''Отзывает токены на обоих уровнях кэша'''
+
+        cache.delete_many([template.format(key) for key in keys
+                           for template in (TOKEN_STAMP_KEY, TOKEN_USER_KEY)])
+        for key in keys:
+            self.discard(key)
+
+
+token_cache = TokenCache()
+
+
+def invalidate_user_tokens(user_id):
+    '''Отзывает закэшированные токены пользователя'''
+
+    keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    token_cache.invalidate(*keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    Аутентификация по токену, которая обращается к базе только
+    при промахе кэша. Каждый запрос получает свою копию пользователя
+    '''
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            user = copy.copy(user)
+            return (user, Token(key=key, user=user))
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Недействительный токен.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'Пользователь неактивен или удален.')
+        token_cache.set(key, copy.copy(token.user))
+        return (token.user, token)
@@ -113,6 +113,43 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 MEDIA_URL = '/media/'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+    }
+}
+
+RECIPE_COUNT_CACHE_TIMEOUT = 60
+
+RECIPE_COUNT_ESTIMATE = os.getenv('RECIPE_COUNT_ESTIMATE', 'False') == 'True'
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+UPLOAD_TEMP_ROOT = BASE_DIR / 'uploads'
+
+UPLOAD_TTL_HOURS = 24
+
+CATALOG_ROOT = BASE_DIR / 'catalog'
+
+CATALOG_URL = '/catalog/'
+
+INGREDIENT_INDEX_PATH = os.getenv('INGREDIENT_INDEX_PATH',
+                                  BASE_DIR / 'index' / 'ingredients.idx')
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+SHOPPING_CART_PDF_WORKERS = int(os.getenv('SHOPPING_CART_PDF_WORKERS', 2))
+
+SHOPPING_CART_PDF_TIMEOUT = 30
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10_000))
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -122,8 +159,22 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'foodgram.authentication.CachedTokenAuthentication',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'recipes': os.getenv('THROTTLE_RECIPES', '240/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', '20/min'),
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', '10/min'),
+        'ingredients': os.getenv('THROTTLE_INGREDIENTS', '300/min'),
+        'uploads': os.getenv('THROTTLE_UPLOADS', '120/min'),
+        'auth': os.getenv('THROTTLE_AUTH', '10/min'),
+    },
+    'THROTTLE_BACKEND': os.getenv('THROTTLE_BACKEND',
+                                  'api.throttling.CacheBucketStorage'),
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
 '''AUTHENTICATION_BACKENDS = (
@@ -1,9 +1,19 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from recipes.images import VARIANTS, VARIANTS_DIR, serve_variant
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.DEBUG:
+    urlpatterns.append(re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}{VARIANTS_DIR}/'
+        rf'(?P<path>.+\.(?:{"|".join(VARIANTS)}))$',
+        serve_variant))
+
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
 
+from .constants import ADMIN_LIST_PER_PAGE
 from .forms import RecipeForm
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredients,
                      RecipeTags, ShoppingCart, Tag)
+from .shopping_list import track_recipe_changes
 
 
 @admin.register(Tag)
@@ -21,14 +24,16 @@ class IngredientAdmin(admin.ModelAdmin):
     '''Админский интерфейс для модели ингредиентов'''
 
     list_display = ('id', 'name', 'measurement_unit')
-    list_editable = ('name', 'measurement_unit',)
-    search_fields = ('name',)
+    search_fields = ('^name',)
+    list_per_page = ADMIN_LIST_PER_PAGE
+    show_full_result_count = False
 
 
 class RecipeIngredientsInline(admin.TabularInline):
     model = RecipeIngredients
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
@@ -38,10 +43,25 @@ class RecipeAdmin(admin.ModelAdmin):
     form = RecipeForm
     list_display = ('id', 'author', 'name',
                     'favorites', 'display_ingredients', 'display_image')
-    list_editable = ('author', 'name')
+    list_editable = ('name',)
     search_fields = ('author__username', 'name')
     list_filter = ('tags',)
     inlines = (RecipeIngredientsInline,)
+    autocomplete_fields = ('author',)
+    list_per_page = ADMIN_LIST_PER_PAGE
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author').prefetch_related(Prefetch(
+                'recipe_ingredients',
+                RecipeIngredients.objects.select_related('ingredient')))
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            return super().save_related(request, form, formsets, change)
+        with track_recipe_changes({form.instance.pk}):
+            super().save_related(request, form, formsets, change)
 
     @admin.display(description='Избранное')
     def favorites(self, obj):
@@ -49,7 +69,7 @@ class RecipeAdmin(admin.ModelAdmin):
         Метод, возвращающий количество
         избранных рецептов для данного рецепта
         '''
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
     @admin.display(description='Связанные ингредиенты')
     def display_ingredients(self, obj):
@@ -79,7 +99,26 @@ class RecipeIngredientsAdmin(admin.ModelAdmin):
     '''Админский интерфейс для модели игредиентов рецептов'''
 
     list_display = ('id', 'recipe', 'ingredient')
-    list_editable = ('recipe', 'ingredient')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    list_per_page = ADMIN_LIST_PER_PAGE
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(RecipeIngredients.objects.filter(
+                pk=obj.pk).values_list('recipe_id', flat=True))
+        with track_recipe_changes(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with track_recipe_changes({obj.recipe_id}):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with track_recipe_changes(
+                set(queryset.values_list('recipe_id', flat=True))):
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(RecipeTags)
@@ -87,13 +126,17 @@ class RecipeTagsAdmin(admin.ModelAdmin):
     '''Админский интерфейс для модели тегов рецептов'''
 
     list_display = ('id', 'recipe', 'tag')
-    list_editable = ('recipe', 'tag')
+    list_select_related = ('recipe', 'tag')
+    autocomplete_fields = ('recipe',)
+    list_per_page = ADMIN_LIST_PER_PAGE
 
 
 class UserRecipe(admin.ModelAdmin):
     '''Базовый класс для описания полей пользователя и рецепта'''
     list_display = ('id', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    list_per_page = ADMIN_LIST_PER_PAGE
 
 
 @admin.register(Favorite)
@@ -3,3 +3,20 @@ INGREDIENT_NAME_LENGTH = 128
 INGREDIENT_UNIT_LENGTH = 64
 RECIPE_NAME_LENGTH = 256
 MIN_VALUE = 1
+MAX_TAG_BIT = 62
+FUZZY_SIMILARITY = 0.5
+FUZZY_SEARCH_LIMIT = 10
+FUZZY_RERANK_LIMIT = 20
+FUZZY_SEARCH_BUDGET = 0.01
+RECIPE_COUNTERS = ('favorites_count', 'shopping_cart_count')
+ADMIN_LIST_PER_PAGE = 50
+SEARCH_CONFIG = 'russian'
+PANTRY_MAX_CHANGES = 1000
+PANTRY_CHANGE_TTL = 24 * 60 * 60
+SIMILARITY_TOP_K = 10
+SIMILARITY_CHUNK_SIZE = 1000
+SIMILARITY_TAG_WEIGHT = 0.5
+SIMILARITY_MAX_SHARE = 0.01
+SIMILARITY_MIN_FEATURE_LIMIT = 100
+SIMILARITY_CANDIDATES = 100
+SIMILARITY_MAX_PRODUCTS = 2_000_000
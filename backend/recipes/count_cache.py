@@ -0,0 +1,92 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+RECIPES_VERSION_KEY = 'recipes:version'
+USER_LISTS_VERSION_KEY = 'recipes:user_lists:{}'
+COUNT_KEY = 'recipes:count:{}:{}:{}'
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+PAGINATION_PARAMS = ('page', 'limit', 'cursor', 'pagination')
+
+
+def get_version(key):
+    '''Возвращает версию набора данных, создавая ее при отсутствии'''
+
+    cache.add(key, 1, None)
+    return cache.get(key, 1)
+
+
+def bump_version(key):
+    '''Увеличивает версию, делая устаревшими все связанные счетчики'''
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_recipes_version():
+    '''Сбрасывает счетчики после изменения рецептов или их тегов'''
+
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def bump_user_lists_version(user_id):
+    '''Сбрасывает счетчики избранного и списка покупок пользователя'''
+
+    bump_version(USER_LISTS_VERSION_KEY.format(user_id))
+
+
+def get_count_key(request):
+    '''
+    Возвращает ключ счетчика для нормализованного набора фильтров.
+    Фильтры по спискам пользователя добавляют в ключ версию
+    его избранного и списка покупок. Сами фильтры хэшируются, так как
+    поисковый запрос может содержать пробелы и любые символы
+    '''
+    params = []
+    user_lists = False
+    for name in sorted(request.query_params):
+        if name in PAGINATION_PARAMS:
+            continue
+        values = sorted(set(request.query_params.getlist(name)))
+        if name in USER_FLAGS:
+            values = ['1' if values[-1].lower() in ('1', 'true') else '0']
+            user_lists = user_lists or values == ['1']
+        params.append(f'{name}={",".join(values)}')
+    user_part = ''
+    if user_lists and request.user.is_authenticated:
+        user_id = request.user.id
+        user_part = (f'{user_id}.'
+                     f'{get_version(USER_LISTS_VERSION_KEY.format(user_id))}')
+    filters = hashlib.md5('&'.join(params).encode()).hexdigest()
+    return COUNT_KEY.format(get_version(RECIPES_VERSION_KEY), user_part,
+                            filters)
+
+
+def estimate_count(model):
+    '''
+    Возвращает оценку количества строк таблицы из статистики Postgres
+    или None, если оценка недоступна
+    '''
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                       (model._meta.db_table,))
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def get_cached_count(key, calculate):
+    '''Возвращает счетчик из кэша, вычисляя его при промахе'''
+
+    count = cache.get(key)
+    if count is None:
+        count = calculate()
+        cache.set(key, count, settings.RECIPE_COUNT_CACHE_TIMEOUT)
+    return count
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribe
+
+from .models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+COUNTERS = {
+    Favorite: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'shopping_cart_count'),
+    Recipe: ('author', User, 'recipes_count'),
+    Subscribe: ('author', User, 'followers_count'),
+}
+
+
+def change_counter(model, pk, counter, delta):
+    '''
+    Атомарно изменяет счетчик объекта на delta. Счетчик
+    не уменьшается ниже нуля, даже если разошелся с данными
+    '''
+    if pk is None or not delta:
+        return
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter}__gte': -delta})
+    queryset.update(**{counter: F(counter) + delta})
+
+
+def get_target_id(instance):
+    '''Возвращает id объекта, счетчик которого учитывает instance'''
+
+    field, _, _ = COUNTERS[type(instance)]
+    return getattr(instance, f'{field}_id')
+
+
+def remember_target(instance, update_fields=None):
+    '''
+    Запоминает id объекта, которому принадлежала запись до сохранения,
+    чтобы перенести единицу счетчика при смене владельца
+    '''
+    field, _, _ = COUNTERS[type(instance)]
+    instance._counter_target_id = None
+    if instance._state.adding or (
+            update_fields is not None and field not in update_fields):
+        return
+    instance._counter_target_id = type(instance).objects.filter(
+        pk=instance.pk).values_list(f'{field}_id', flat=True).first()
+
+
+def count_saved(instance, created):
+    '''Учитывает созданную или перенесенную запись в счетчиках'''
+
+    _, model, counter = COUNTERS[type(instance)]
+    target_id = get_target_id(instance)
+    if created:
+        change_counter(model, target_id, counter, 1)
+        return
+    old_target_id = getattr(instance, '_counter_target_id', None)
+    if old_target_id is not None and old_target_id != target_id:
+        change_counter(model, old_target_id, counter, -1)
+        change_counter(model, target_id, counter, 1)
+
+
+def count_deleted(instance):
+    '''Вычитает удаленную запись из счетчика'''
+
+    _, model, counter = COUNTERS[type(instance)]
+    change_counter(model, get_target_id(instance), counter, -1)
+
+
+def rebuild_counters(fix=True):
+    '''
+    Сверяет счетчики с фактическим количеством записей.
+    Возвращает число расхождений; при fix=True пересчитывает
+    расходящиеся счетчики одним запросом на каждый счетчик
+    '''
+    mismatches = 0
+    for source, (field, model, counter) in COUNTERS.items():
+        actual = Coalesce(Subquery(
+            source.objects.filter(**{field: OuterRef('pk')}).order_by(
+            ).values(field).annotate(total=Count('pk')).values('total')), 0)
+        inconsistent = model.objects.alias(actual=actual).exclude(
+            **{counter: F('actual')})
+        mismatches += inconsistent.count()
+        if fix:
+            model.objects.filter(
+                pk__in=inconsistent.values('pk')).update(**{counter: actual})
+    return mismatches
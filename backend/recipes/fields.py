@@ -0,0 +1,27 @@
+from django.db import models
+from django.db.models import Lookup
+
+
+class SearchVectorField(models.Field):
+    '''
+    Поле tsvector для полнотекстового поиска. Значение заполняет
+    триггер PostgreSQL; на других СУБД поле хранится как текст
+    и не используется
+    '''
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return 'text'
+
+
+@SearchVectorField.register_lookup
+class SearchMatches(Lookup):
+    '''Проверка соответствия документа поисковому запросу (@@)'''
+
+    lookup_name = 'matches'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} @@ {rhs}', (*lhs_params, *rhs_params)
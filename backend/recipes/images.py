@@ -0,0 +1,119 @@
+import logging
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.cache import patch_vary_headers
+from django.views.static import serve
+from PIL import Image, ImageOps
+
+VARIANTS = {'small': 320, 'medium': 960}
+FORMATS = {'webp': ('WEBP', 80), 'jpeg': ('JPEG', 85)}
+VARIANTS_DIR = 'variants'
+
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+logger = logging.getLogger(__name__)
+
+
+def get_variant_root(name, variant):
+    '''
+    Возвращает имя уменьшенной копии изображения без расширения,
+    общее для всех ее форматов
+    '''
+    root, _ = posixpath.splitext(name)
+    return posixpath.join(VARIANTS_DIR, f'{root}.{variant}')
+
+
+def get_variant_name(name, variant, image_format):
+    '''Возвращает имя файла уменьшенной копии изображения'''
+
+    return f'{get_variant_root(name, variant)}.{image_format}'
+
+
+def get_variant_url(name, variant):
+    '''
+    Возвращает адрес уменьшенной копии изображения без расширения
+    или None, если копии еще не созданы. Формат WebP или JPEG
+    выбирает nginx по заголовку Accept запроса самого изображения
+    '''
+    if not all(default_storage.exists(get_variant_name(name, variant,
+                                                       image_format))
+               for image_format in FORMATS):
+        return None
+    return default_storage.url(get_variant_root(name, variant))
+
+
+def get_accepted_format(accept):
+    '''Выбирает формат уменьшенной копии по заголовку Accept'''
+
+    return 'webp' if 'image/webp' in accept else 'jpeg'
+
+
+def serve_variant(request, path):
+    '''
+    Отдает уменьшенную копию при разработке без nginx, выбирая
+    формат так же, как nginx в infra/nginx.conf
+    '''
+    image_format = get_accepted_format(request.headers.get('Accept', ''))
+    response = serve(request, f'{path}.{image_format}',
+                     document_root=os.path.join(settings.MEDIA_ROOT,
+                                                VARIANTS_DIR))
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def has_variants(name):
+    '''Проверяет, созданы ли все уменьшенные копии изображения'''
+
+    return all(
+        default_storage.exists(get_variant_name(name, variant, image_format))
+        for variant in VARIANTS for image_format in FORMATS
+    )
+
+
+def generate_variants(name):
+    '''
+    Создает уменьшенные копии изображения в форматах WebP и JPEG.
+    Файлы записываются атомарно, поэтому частично записанная копия
+    никогда не отдается клиенту
+    '''
+    with Image.open(default_storage.path(name)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        for variant, width in VARIANTS.items():
+            image = original.copy()
+            image.thumbnail((width, width * 4))
+            for image_format, (pil_format, quality) in FORMATS.items():
+                path = default_storage.path(
+                    get_variant_name(name, variant, image_format))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, 'wb') as file:
+                    result = image
+                    if pil_format == 'JPEG':
+                        result = image.convert('RGB')
+                    result.save(file, pil_format, quality=quality)
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, path)
+
+
+def log_failure(name, future):
+    '''Записывает в журнал ошибку создания уменьшенных копий'''
+
+    error = future.exception()
+    if error is not None:
+        logger.error('Failed to generate image variants for %s', name,
+                     exc_info=error)
+
+
+def schedule_variants(name):
+    '''Ставит создание уменьшенных копий в очередь фонового пула'''
+
+    if name and not has_variants(name):
+        executor.submit(generate_variants, name).add_done_callback(
+            partial(log_failure, name))
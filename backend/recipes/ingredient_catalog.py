@@ -0,0 +1,89 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CATALOG_NAME = 'ingredients'
+MANIFEST_NAME = f'{CATALOG_NAME}.manifest.json'
+KEEP_VERSIONS = 3
+
+
+def write_atomic(path, content):
+    '''Записывает файл так, чтобы читатели не видели его частично'''
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as file:
+        file.write(content)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+
+def remove_old_versions(root, current):
+    '''Удаляет устаревшие версии каталога, оставляя несколько последних'''
+
+    versions = sorted(
+        (entry for entry in os.scandir(root)
+         if entry.name.startswith(f'{CATALOG_NAME}.')
+         and entry.name.endswith('.json')
+         and entry.name not in (current, MANIFEST_NAME)),
+        key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[KEEP_VERSIONS - 1:]:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(entry.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def export_catalog():
+    '''
+    Выгружает каталог ингредиентов в JSON файл, имя которого
+    содержит хеш содержимого, вместе со сжатыми копиями для раздачи
+    через nginx. Возвращает манифест с текущей версией
+    '''
+    from .models import Ingredient
+
+    ingredients = [
+        {'id': pk, 'name': name, 'measurement_unit': unit}
+        for pk, name, unit in Ingredient.objects.order_by('id').values_list(
+            'id', 'name', 'measurement_unit').iterator()
+    ]
+    content = json.dumps(ingredients, ensure_ascii=False,
+                         separators=(',', ':')).encode()
+    version = hashlib.sha256(content).hexdigest()[:16]
+    file_name = f'{CATALOG_NAME}.{version}.json'
+    root = settings.CATALOG_ROOT
+    os.makedirs(root, exist_ok=True)
+
+    path = os.path.join(root, file_name)
+    if not os.path.exists(path):
+        write_atomic(path + '.gz', gzip.compress(content, mtime=0))
+        if brotli is not None:
+            write_atomic(path + '.br', brotli.compress(content))
+        write_atomic(path, content)
+
+    manifest = {'version': version,
+                'url': f'{settings.CATALOG_URL}{file_name}'}
+    write_atomic(os.path.join(root, MANIFEST_NAME),
+                 json.dumps(manifest).encode())
+    remove_old_versions(root, file_name)
+    return manifest
+
+
+def get_manifest():
+    '''Возвращает манифест текущей версии каталога'''
+
+    try:
+        with open(os.path.join(settings.CATALOG_ROOT, MANIFEST_NAME),
+                  'rb') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return export_catalog()
@@ -0,0 +1,262 @@
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import defaultdict
+from threading import Lock
+
+from django.conf import settings
+
+from .constants import (FUZZY_RERANK_LIMIT, FUZZY_SEARCH_BUDGET,
+                        FUZZY_SEARCH_LIMIT, FUZZY_SIMILARITY)
+
+MAGIC = b'IGX1'
+HEADER = struct.Struct('<4sI')
+OFFSET = struct.Struct('<I')
+SEPARATOR = b'\x00'
+
+
+def normalize(name):
+    '''Приводит название к виду для поиска без учета регистра'''
+
+    return name.casefold().replace('ё', 'е')
+
+
+def trigrams(name):
+    '''
+    Возвращает множество триграмм названия. Как и в pg_trgm,
+    каждое слово дополняется двумя пробелами в начале и одним в конце
+    '''
+    result = set()
+    for word in normalize(name).split():
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+def levenshtein(first, second):
+    '''Возвращает расстояние Левенштейна между двумя строками'''
+
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+
+def common_prefix(first, second):
+    '''Возвращает длину общего начала двух строк'''
+
+    return len(os.path.commonprefix((first, second)))
+
+
+def edit_similarity(query, name):
+    '''
+    Возвращает похожесть запроса на название по расстоянию
+    Левенштейна: каждое слово запроса сравнивается с наиболее
+    похожим словом названия, результат усредняется
+    '''
+    name_words = name.split()
+    query_words = query.split()
+    return sum(
+        max(1 - levenshtein(word, name_word) / max(len(word), len(name_word))
+            for name_word in name_words)
+        for word in query_words
+    ) / len(query_words)
+
+
+def build_index(ingredients, path=None):
+    '''
+    Записывает отсортированный индекс названий ингредиентов в файл.
+    Принимает последовательность кортежей (id, name, measurement_unit).
+    Файл заменяется атомарно, поэтому читатели не видят его частично
+    записанным
+    '''
+    path = path or settings.INGREDIENT_INDEX_PATH
+    records = sorted(
+        SEPARATOR.join((normalize(name).encode(), str(pk).encode(),
+                        name.encode(), unit.encode()))
+        for pk, name, unit in ingredients
+    )
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(records)))
+        file.write(b''.join(OFFSET.pack(offset) for offset in offsets))
+        file.write(b''.join(records))
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+
+def rebuild_index():
+    '''Перестраивает индекс по текущему каталогу ингредиентов'''
+
+    from .models import Ingredient
+
+    build_index(Ingredient.objects.values_list(
+        'id', 'name', 'measurement_unit').iterator())
+
+
+class IngredientIndex:
+    '''
+    Префиксный индекс ингредиентов поверх файла, отображенного
+    в память. Все процессы читают одну копию из страничного кэша ОС,
+    а после атомарной замены файла индекс переоткрывается
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = Lock()
+        self.signature = None
+        self.state = None
+        self.trigram_signature = None
+        self.trigram_state = None
+
+    def open(self):
+        '''
+        Отображает файл индекса в память, если он изменился,
+        и возвращает пару (буфер, количество записей)
+        '''
+        path = self.path or settings.INGREDIENT_INDEX_PATH
+        if not os.path.exists(path):
+            rebuild_index()
+        stat = os.stat(path)
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return self.state
+        with self.lock:
+            if signature == self.signature:
+                return self.state
+            with open(path, 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count = HEADER.unpack_from(buffer)
+            if magic != MAGIC:
+                raise ValueError(f'Некорректный файл индекса: {path}')
+            self.state = (buffer, count)
+            self.signature = signature
+        return self.state
+
+    @staticmethod
+    def record(buffer, count, position):
+        '''Возвращает запись индекса по ее номеру'''
+
+        start, end = struct.unpack_from(
+            '<2I', buffer, HEADER.size + position * OFFSET.size)
+        data = HEADER.size + (count + 1) * OFFSET.size
+        return buffer[data + start:data + end].split(SEPARATOR)
+
+    def records(self, buffer, count):
+        '''Возвращает все записи индекса'''
+
+        return [self.record(buffer, count, position)
+                for position in range(count)]
+
+    @staticmethod
+    def serialize(record):
+        '''Возвращает запись индекса в виде словаря ингредиента'''
+
+        _, pk, name, unit = record
+        return {'id': int(pk), 'name': name.decode(),
+                'measurement_unit': unit.decode()}
+
+    def open_trigrams(self):
+        '''
+        Строит инвертированный индекс триграмм по текущему файлу
+        индекса и возвращает пару (записи, индекс триграмм)
+        '''
+        buffer, count = self.open()
+        signature = self.signature
+        if signature == self.trigram_signature:
+            return self.trigram_state
+        with self.lock:
+            if signature != self.trigram_signature:
+                records = self.records(buffer, count)
+                postings = defaultdict(list)
+                sizes = []
+                for position, record in enumerate(records):
+                    name_trigrams = trigrams(record[0].decode())
+                    sizes.append(len(name_trigrams))
+                    for trigram in name_trigrams:
+                        postings[trigram].append(position)
+                self.trigram_state = (records, sizes, dict(postings))
+                self.trigram_signature = signature
+        return self.trigram_state
+
+    def fuzzy_search(self, query, limit=FUZZY_SEARCH_LIMIT,
+                     budget=FUZZY_SEARCH_BUDGET):
+        '''
+        Возвращает не более limit ингредиентов, наиболее похожих
+        на query. Кандидаты отбираются по общим триграммам, списки
+        которых обходятся от редких к частым; по истечении budget секунд
+        обход прекращается. Лучшие по триграммной похожести кандидаты
+        переранжируются с учетом расстояния Левенштейна. При равной
+        похожести выше идут названия с более длинным общим началом:
+        в начале слова опечатки встречаются реже
+        '''
+        records, sizes, postings = self.open_trigrams()
+        query = normalize(query).strip()
+        query_key = query.encode()
+        query_size = len(trigrams(query))
+        query_trigrams = [trigram for trigram in trigrams(query)
+                          if trigram in postings]
+        query_trigrams.sort(key=lambda trigram: len(postings[trigram]))
+        deadline = time.monotonic() + budget
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in postings[trigram]:
+                shared[position] += 1
+            if time.monotonic() > deadline:
+                break
+
+        candidates = heapq.nlargest(
+            FUZZY_RERANK_LIMIT, shared.items(),
+            key=lambda item: (
+                item[1] / (query_size + sizes[item[0]] - item[1]),
+                common_prefix(query_key, records[item[0]][0])))
+        scored = []
+        for position, common in candidates:
+            name = records[position][0].decode()
+            similarity = max(
+                common / (query_size + sizes[position] - common),
+                edit_similarity(query, name))
+            if similarity >= FUZZY_SIMILARITY:
+                scored.append((similarity, common_prefix(query, name),
+                               -sizes[position], -position))
+        return [self.serialize(records[-position])
+                for *_, position in heapq.nlargest(limit, scored)]
+
+    def search(self, prefix):
+        '''
+        Возвращает ингредиенты, название которых начинается с prefix.
+        Точные и более короткие совпадения идут первыми
+        '''
+        buffer, count = self.open()
+        key = normalize(prefix).encode()
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(buffer, count, middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        matches = []
+        for position in range(low, count):
+            record = self.record(buffer, count, position)
+            if not record[0].startswith(key):
+                break
+            matches.append(record)
+        matches.sort(key=lambda record: (len(record[0].decode()), record[0]))
+        return [self.serialize(record) for record in matches]
+
+
+ingredient_index = IngredientIndex()
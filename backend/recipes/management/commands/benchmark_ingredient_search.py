@@ -0,0 +1,37 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.ingredient_index import ingredient_index, rebuild_index
+
+QUERIES = ('малако', 'сахр', 'мука пшенична', 'яйцо куриное', 'памидор',
+           'картофиль', 'сметна', 'чеснок', 'перец чорный', 'абрикос')
+
+
+class Command(BaseCommand):
+    help = ('Measure fuzzy ingredient search latency over the catalog '
+            'loaded by import_csv')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=100)
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        ingredient_index.open_trigrams()
+        timings = []
+        for _ in range(options['repeat']):
+            for query in QUERIES:
+                start = time.perf_counter()
+                ingredient_index.fuzzy_search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'queries: {len(timings)}, '
+            f'p50: {statistics.median(timings):.3f} ms, '
+            f'p95: {timings[int(len(timings) * 0.95)]:.3f} ms, '
+            f'max: {timings[-1]:.3f} ms')
+        for query in QUERIES:
+            names = [ingredient['name']
+                     for ingredient in ingredient_index.fuzzy_search(query)]
+            self.stdout.write(f'{query}: {", ".join(names[:3])}')
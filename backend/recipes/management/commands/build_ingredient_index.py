@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ingredient_index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ingredient prefix index file'
+
+    def handle(self, *args, **options):
+        rebuild_index()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.constants import SIMILARITY_CHUNK_SIZE, SIMILARITY_TOP_K
+from recipes.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = ('Compute similar recipes by ingredient and tag overlap '
+            'and store top-K neighbours of each recipe')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only recipes changed since the last run')
+        parser.add_argument('--top-k', type=int, default=SIMILARITY_TOP_K)
+        parser.add_argument('--chunk-size', type=int,
+                            default=SIMILARITY_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        count = build_similar_recipes(
+            incremental=options['incremental'], top_k=options['top_k'],
+            chunk_size=options['chunk_size'])
+        self.stdout.write(f'Recomputed similar recipes for {count} recipes')
@@ -0,0 +1,87 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.counters import rebuild_counters
+from recipes.models import (Ingredient, Recipe, RecipeTags, Tag,
+                            get_tags_mask)
+from users.models import Subscribe
+
+User = get_user_model()
+
+SEED_PREFIX = 'seed_'
+SEED_WORDS = ('борщ', 'пирог', 'салат', 'суп', 'котлеты', 'блины', 'каша',
+              'рагу', 'плов', 'омлет', 'запеканка', 'пельмени')
+
+
+class Command(BaseCommand):
+    help = ('Print query plans for the hot lookup paths. Run it before and '
+            'after migrating to compare plans; --seed fills a benchmark '
+            'database with synthetic recipes first')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Number of synthetic recipes to create')
+
+    @transaction.atomic
+    def seed(self, count):
+        authors_count = max(count // 20, 1)
+        User.objects.bulk_create(
+            User(username=f'{SEED_PREFIX}{i}', email=f'{SEED_PREFIX}{i}@x.ru')
+            for i in range(authors_count))
+        authors = list(User.objects.filter(
+            username__startswith=SEED_PREFIX).values_list('id', flat=True))
+        Tag.objects.bulk_create(
+            (Tag(name=f'{SEED_PREFIX}{i}', slug=f'{SEED_PREFIX}{i}')
+             for i in range(8)), ignore_conflicts=True)
+        tags = list(Tag.objects.values_list('id', flat=True))
+        Recipe.objects.bulk_create(
+            (Recipe(author_id=random.choice(authors),
+                    name=f'{SEED_PREFIX}{i}',
+                    text=' '.join(random.sample(SEED_WORDS, 3)) + f' {i}',
+                    cooking_time=10,
+                    image='recipe_images/seed.png')
+             for i in range(count)), batch_size=5000)
+        recipes = Recipe.objects.filter(
+            name__startswith=SEED_PREFIX).values_list('id', flat=True)
+        RecipeTags.objects.bulk_create(
+            (RecipeTags(recipe_id=recipe, tag_id=random.choice(tags))
+             for recipe in recipes.iterator()), batch_size=5000)
+        for tag in tags:
+            Recipe.objects.filter(name__startswith=SEED_PREFIX,
+                                  recipe_tags__tag_id=tag).update(
+                tags_mask=get_tags_mask((tag,)))
+        Subscribe.objects.bulk_create(
+            Subscribe(user_id=random.choice(authors),
+                      author_id=random.choice(authors))
+            for _ in range(authors_count * 10))
+        rebuild_counters()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+        author = Recipe.objects.values_list('author_id', flat=True).first()
+        tag = Tag.objects.values_list('id', flat=True).first()
+        subscription = Subscribe.objects.values_list(
+            'user_id', 'author_id').first() or (author, author)
+        queries = {
+            'recipe feed': Recipe.objects.order_by('-pub_date', '-id')[:6],
+            'recipes of author': Recipe.objects.filter(author_id=author)[:6],
+            'recipes by tag': Recipe.objects.with_any_tag(
+                Tag.objects.filter(id=tag))[:6],
+            'is_subscribed probe': Subscribe.objects.filter(
+                user_id=subscription[0], author_id=subscription[1]),
+            'recipe search': Recipe.objects.search('борщ с пирогом')[:6],
+            'ingredient prefix': Ingredient.objects.filter(
+                name__istartswith='мо'),
+        }
+        analyze = connection.vendor == 'postgresql'
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(analyze=analyze)
+                              if analyze else queryset.explain())
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ingredient_catalog import export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Export a content-hashed snapshot of the ingredient catalog'
+
+    def handle(self, *args, **options):
+        manifest = export_catalog()
+        self.stdout.write(f'{manifest["version"]}: {manifest["url"]}')
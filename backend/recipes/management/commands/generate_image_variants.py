@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants, has_variants
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized variants of recipe images and avatars'
+
+    def handle(self, *args, **options):
+        names = Recipe.objects.order_by().values_list(
+            'image', flat=True).union(User.objects.order_by().exclude(
+                avatar='').values_list('avatar', flat=True))
+        generated = 0
+        for name in names.iterator():
+            if name and not has_variants(name):
+                generate_variants(name)
+                generated += 1
+        self.stdout.write(f'Generated variants for {generated} images')
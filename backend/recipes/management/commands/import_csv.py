@@ -4,6 +4,9 @@ from django.apps import apps
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from recipes.ingredient_catalog import export_catalog
+from recipes.ingredient_index import rebuild_index
+
 file_name = settings.BASE_DIR / 'data/ingredients.csv'
 
 
@@ -19,3 +22,5 @@ class Command(BaseCommand):
                                       measurement_unit=measurement_unit)
                            for name, measurement_unit in reader]
         Ingredient.objects.bulk_create(ingredients)
+        rebuild_index()
+        export_catalog()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Check and recompute favorites, recipes and followers counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report inconsistencies')
+
+    def handle(self, *args, **options):
+        mismatches = rebuild_counters(fix=not options['check'])
+        self.stdout.write(f'Inconsistent counters: {mismatches}')
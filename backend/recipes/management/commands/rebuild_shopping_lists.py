@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Check and rebuild aggregated shopping lists from shopping carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report inconsistencies')
+
+    def handle(self, *args, **options):
+        mismatches = rebuild_shopping_lists(fix=not options['check'])
+        self.stdout.write(f'Inconsistent rows: {mismatches}')
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+# Django ищет по istartswith через UPPER("name"::text) LIKE UPPER(%s),
+# поэтому индекс строится по тому же выражению. text_pattern_ops
+# позволяет использовать его для LIKE при любой локали базы.
+INGREDIENT_NAME_INDEX = 'ingredient_upper_name_idx'
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)')
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_shoppinglistingredient'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetags',
+            index=models.Index(fields=['tag', 'recipe'], name='recipetags_tag_recipe_idx'),
+        ),
+        migrations.RunPython(create_ingredient_name_index,
+                             drop_ingredient_name_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-18 02:28
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+MAX_TAG_BIT = 62
+
+
+def fill_tags_masks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTags = apps.get_model('recipes', 'RecipeTags')
+    masks = defaultdict(int)
+    for recipe_id, tag_id in RecipeTags.objects.filter(
+            tag_id__lte=MAX_TAG_BIT).values_list('recipe_id', 'tag_id'):
+        masks[recipe_id] |= 1 << tag_id
+    recipes = [Recipe(pk=recipe_id, tags_mask=mask)
+               for recipe_id, mask in masks.items()]
+    Recipe.objects.bulk_update(recipes, ('tags_mask',), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='битовая маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='similar_computed',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='дата расчета похожих рецептов'),
+        ),
+    ]
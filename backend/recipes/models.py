@@ -1,9 +1,16 @@
+import re
+
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models
+from django.db.models import Exists, F, OuterRef, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
 from .constants import (INGREDIENT_NAME_LENGTH, INGREDIENT_UNIT_LENGTH,
-                        MIN_VALUE, RECIPE_NAME_LENGTH, TAG_MAX_LENGTH)
+                        MAX_TAG_BIT, MIN_VALUE, RECIPE_COUNTERS,
+                        RECIPE_NAME_LENGTH, SEARCH_CONFIG, TAG_MAX_LENGTH)
+from .fields import SearchVectorField
 
 User = get_user_model()
 
@@ -22,6 +29,18 @@ class Tag(models.Model):
         return self.name
 
 
+def get_tags_mask(tag_ids):
+    '''
+    Возвращает битовую маску тегов. Теги с id больше MAX_TAG_BIT
+    в маску не попадают
+    '''
+    mask = 0
+    for tag_id in tag_ids:
+        if tag_id <= MAX_TAG_BIT:
+            mask |= 1 << tag_id
+    return mask
+
+
 class Ingredient(models.Model):
     '''Модель для представления ингредиентов'''
 
@@ -38,6 +57,88 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    '''Набор запросов для рецептов'''
+
+    def with_related(self):
+        '''
+        Подгружает автора, теги и ингредиенты рецептов
+        фиксированным числом запросов
+        '''
+        return self.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredients.objects.select_related(
+                         'ingredient')),
+        )
+
+    def latest_by_author(self, limit=None):
+        '''
+        Возвращает не более limit последних рецептов
+        каждого автора одним оконным запросом
+        '''
+        if limit is None:
+            return self.order_by('-pub_date')
+        ranked = self.order_by().annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc()))
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            'WHERE ranked.row_number <= %s ORDER BY ranked.pub_date DESC',
+            (*params, limit))
+
+    def with_any_tag(self, tags):
+        '''
+        Оставляет рецепты, у которых есть хотя бы один из тегов.
+        Проверяется битовая маска тегов рецепта без соединения
+        с таблицей тегов
+        '''
+        if any(tag.id > MAX_TAG_BIT for tag in tags):
+            return self.filter(tags__in=tags).distinct()
+        return self.alias(
+            matched_tags=F('tags_mask').bitand(get_tags_mask(
+                tag.id for tag in tags))
+        ).filter(matched_tags__gt=0)
+
+    def search(self, text):
+        '''
+        Полнотекстовый поиск по названию и описанию. В PostgreSQL
+        используется столбец tsvector с GIN индексом, а результаты
+        упорядочиваются по релевантности. На других СУБД каждое слово
+        ищется без учета регистра в названии или описании
+        '''
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank
+
+            query = SearchQuery(text, config=SEARCH_CONFIG,
+                                search_type='websearch')
+            return self.filter(search_vector__matches=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-pub_date', '-id')
+        queryset = self
+        for word in text.split():
+            pattern = re.escape(word)
+            queryset = queryset.filter(
+                Q(name__iregex=pattern) | Q(text__iregex=pattern))
+        return queryset
+
+    def with_user_flags(self, user):
+        '''
+        Аннотирует рецепты флагами наличия в избранном
+        и списке покупок пользователя
+        '''
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+
 class Recipe(models.Model):
     '''Модель для представления рецептов'''
 
@@ -54,15 +155,58 @@ class Recipe(models.Model):
         'время приготовления (в минутах)',
         validators=(MinValueValidator(MIN_VALUE),))
     pub_date = models.DateTimeField('дата публикации', auto_now_add=True)
+    tags_mask = models.BigIntegerField('битовая маска тегов', default=0,
+                                       editable=False)
+    search_vector = SearchVectorField('поисковый вектор', null=True,
+                                      editable=False)
+    modified = models.DateTimeField('дата изменения', auto_now=True)
+    similar_computed = models.DateTimeField(
+        'дата расчета похожих рецептов', null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'количество добавлений в избранное', default=0, editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        'количество добавлений в список покупок', default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date'),
+                         name='recipe_author_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        '''
+        Сохраняет объект, не перезаписывая счетчики и поисковый вектор:
+        их изменяют только атомарные обновления и триггер базы.
+        Дата изменения обновляется при любом сохранении
+        '''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'modified'}
+        elif not (self._state.adding or kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in (*RECIPE_COUNTERS, 'search_vector')
+            ]
+        super().save(*args, **kwargs)
+
+    def update_tags_mask(self):
+        '''Пересчитывает битовую маску тегов рецепта'''
+
+        self.tags_mask = get_tags_mask(RecipeTags.objects.filter(
+            recipe=self).values_list('tag_id', flat=True))
+        Recipe.objects.filter(pk=self.pk).update(tags_mask=self.tags_mask)
+
 
 class RecipeIngredients(models.Model):
     '''Модель для представления ингредиентов рецептов'''
@@ -92,6 +236,10 @@ class RecipeTags(models.Model):
     class Meta:
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецептов'
+        indexes = (
+            models.Index(fields=('tag', 'recipe'),
+                         name='recipetags_tag_recipe_idx'),
+        )
 
 
 class UserRecipe(models.Model):
@@ -130,3 +278,53 @@ class ShoppingCart(UserRecipe):
             models.UniqueConstraint(fields=('user', 'recipe'),
                                     name='unique_shopping_cart'),
         )
+
+
+class ShoppingListIngredient(models.Model):
+    '''
+    Модель для представления суммарного количества ингредиента
+    в списке покупок пользователя
+    '''
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             verbose_name='владелец',
+                             related_name='shopping_list')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   verbose_name='ингредиент')
+    amount = models.IntegerField('количество', default=0)
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_shopping_list_ingredient'),
+        )
+
+
+class SimilarRecipe(models.Model):
+    '''
+    Модель для представления похожего рецепта. Заполняется
+    командой build_similar_recipes
+    '''
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='рецепт',
+                               related_name='similar_recipes')
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                                verbose_name='похожий рецепт',
+                                related_name='similar_to')
+    score = models.FloatField('похожесть')
+    computed = models.DateTimeField('дата расчета', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(fields=('recipe', 'similar'),
+                                    name='unique_similar_recipe'),
+        )
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='similar_recipe_score_idx'),
+        )
@@ -0,0 +1,251 @@
+from collections import defaultdict
+from threading import Lock
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .constants import PANTRY_CHANGE_TTL, PANTRY_MAX_CHANGES
+
+VERSION_KEY = 'recipes:pantry:version'
+CHANGE_KEY = 'recipes:pantry:change:{}'
+
+
+def to_bitmap(positions):
+    '''Возвращает битовую карту с установленными битами positions'''
+
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position // 8] |= 1 << position % 8
+    return int.from_bytes(data, 'little')
+
+
+def iter_positions(bitmap):
+    '''Перебирает номера установленных битов по возрастанию'''
+
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+def publish_change(recipe_id):
+    '''
+    Записывает изменение рецепта в общий журнал, по которому
+    индексы всех процессов обновляются инкрементально
+    '''
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 0, None)
+        return
+    cache.set(CHANGE_KEY.format(version), recipe_id, PANTRY_CHANGE_TTL)
+
+
+def recipe_changed(recipe_id):
+    '''Публикует изменение рецепта после фиксации транзакции'''
+
+    transaction.on_commit(lambda: publish_change(recipe_id))
+
+
+class PantryIndex:
+    '''
+    Инвертированный индекс ингредиент -> битовая карта рецептов
+    в памяти процесса. Номер бита — позиция рецепта: при построении
+    рецепты нумеруются от новых к старым, новые рецепты добавляются
+    в конец. Изменения применяются по общему журналу, при его
+    потере индекс перестраивается целиком
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.positions = {}
+        self.recipe_ids = []
+        self.ingredients = []
+        self.bitmaps = defaultdict(int)
+        self.sizes = defaultdict(int)
+
+    def load(self, recipe_ids):
+        '''
+        Загружает ингредиенты рецептов. Возвращает словарь
+        id рецепта -> множество ингредиентов для существующих рецептов
+        '''
+        from .models import Recipe, RecipeIngredients
+
+        existing = Recipe.objects.all()
+        rows = RecipeIngredients.objects.all()
+        if recipe_ids is not None:
+            existing = existing.filter(id__in=recipe_ids)
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        result = {pk: set() for pk in existing.order_by(
+            '-pub_date', '-id').values_list('id', flat=True).iterator()}
+        for recipe_id, ingredient_id in rows.values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            if recipe_id in result:
+                result[recipe_id].add(ingredient_id)
+        return result
+
+    def rebuild(self, version):
+        '''Строит индекс заново по всем рецептам'''
+
+        recipes = self.load(None)
+        self.recipe_ids = list(recipes)
+        self.positions = {pk: position
+                          for position, pk in enumerate(self.recipe_ids)}
+        self.ingredients = [frozenset(recipes[pk]) for pk in self.recipe_ids]
+        postings = defaultdict(list)
+        sizes = defaultdict(list)
+        for position, ingredients in enumerate(self.ingredients):
+            sizes[len(ingredients)].append(position)
+            for ingredient_id in ingredients:
+                postings[ingredient_id].append(position)
+        self.bitmaps = defaultdict(int, {
+            pk: to_bitmap(positions) for pk, positions in postings.items()})
+        self.sizes = defaultdict(int, {
+            size: to_bitmap(positions) for size, positions in sizes.items()})
+        self.version = version
+
+    def apply(self, recipe_ids, version):
+        '''Перезагружает из базы только изменившиеся рецепты'''
+
+        recipes = self.load(recipe_ids)
+        for pk in recipe_ids:
+            position = self.positions.get(pk)
+            if position is not None:
+                bit = 1 << position
+                for ingredient_id in self.ingredients[position]:
+                    self.bitmaps[ingredient_id] &= ~bit
+                self.sizes[len(self.ingredients[position])] &= ~bit
+                self.ingredients[position] = frozenset()
+            if pk not in recipes:
+                continue
+            if position is None:
+                position = len(self.recipe_ids)
+                self.positions[pk] = position
+                self.recipe_ids.append(pk)
+                self.ingredients.append(frozenset())
+            bit = 1 << position
+            self.ingredients[position] = frozenset(recipes[pk])
+            for ingredient_id in recipes[pk]:
+                self.bitmaps[ingredient_id] |= bit
+            self.sizes[len(recipes[pk])] |= bit
+        self.version = version
+
+    def sync(self):
+        '''Приводит индекс к текущей версии общего журнала'''
+
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.get(VERSION_KEY, 0)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            if (self.version is None or version < self.version
+                    or version - self.version > PANTRY_MAX_CHANGES):
+                self.rebuild(version)
+                return
+            keys = [CHANGE_KEY.format(number)
+                    for number in range(self.version + 1, version + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys):
+                self.rebuild(version)
+                return
+            self.apply(set(changes.values()), version)
+
+    def match(self, ingredient_ids):
+        '''
+        Возвращает подходящие рецепты для набора ингредиентов.
+        Сначала идут те, для которых есть все ингредиенты, затем —
+        по убыванию числа совпавших и возрастанию числа недостающих
+        '''
+        self.sync()
+        return PantryMatches(self, set(ingredient_ids) & set(self.bitmaps))
+
+
+class PantryMatches:
+    '''
+    Ленивая выборка рецептов для набора ингредиентов. Количество
+    совпавших ингредиентов каждого рецепта считается побитовым
+    сумматором по битовым картам, а рецепты выдаются группами
+    по числу совпавших и недостающих ингредиентов
+    '''
+
+    def __init__(self, index, ingredient_ids):
+        self.index = index
+        self.planes = []
+        self.union = 0
+        for ingredient_id in ingredient_ids:
+            carry = index.bitmaps[ingredient_id]
+            self.union |= carry
+            for number, plane in enumerate(self.planes):
+                if not carry:
+                    break
+                self.planes[number], carry = plane ^ carry, plane & carry
+            else:
+                if carry:
+                    self.planes.append(carry)
+        self.total = len(ingredient_ids)
+        self.cache = []
+
+    def count(self):
+        return self.union.bit_count()
+
+    def __len__(self):
+        return self.count()
+
+    def with_matched(self, matched):
+        '''
+        Возвращает рецепты, в которых совпало ровно matched ингредиентов.
+        Разрядов сумматора ровно столько, сколько нужно для наибольшего
+        совпадения, поэтому большее число не совпало ни у одного рецепта
+        '''
+        if matched >> len(self.planes):
+            return 0
+        result = self.union
+        for number, plane in enumerate(self.planes):
+            result &= plane if matched >> number & 1 else ~plane
+        return result
+
+    def iter_matches(self):
+        '''
+        Перебирает тройки (id рецепта, совпало, не хватает) в порядке
+        ранжирования: сначала рецепты, для которых есть все ингредиенты,
+        затем остальные по убыванию числа совпавших ингредиентов,
+        а при равенстве — по возрастанию числа недостающих
+        '''
+        matched = {number: self.with_matched(number)
+                   for number in range(1, self.total + 1)}
+        sizes = self.index.sizes
+        complete = 0
+        for number, recipes in matched.items():
+            complete |= recipes & sizes.get(number, 0)
+        for position in iter_positions(complete):
+            yield (self.index.recipe_ids[position],
+                   len(self.index.ingredients[position]), 0)
+        for number in sorted(matched, reverse=True):
+            if not matched[number]:
+                continue
+            for size in sorted(sizes):
+                if size > number:
+                    for position in iter_positions(
+                            sizes[size] & matched[number]):
+                        yield (self.index.recipe_ids[position], number,
+                               size - number)
+
+    def __getitem__(self, key):
+        stop = key.stop if isinstance(key, slice) else key + 1
+        if len(self.cache) < stop:
+            self.cache = []
+            for match in self.iter_matches():
+                self.cache.append(match)
+                if len(self.cache) >= stop:
+                    break
+        return self.cache[key]
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,125 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import RecipeIngredients, ShoppingCart, ShoppingListIngredient
+
+
+def get_recipe_amounts(recipe):
+    '''Возвращает суммарное количество каждого ингредиента рецепта'''
+
+    amounts = Counter()
+    for ingredient_id, amount in RecipeIngredients.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def apply_deltas(user_ids, deltas):
+    '''
+    Изменяет списки покупок пользователей на deltas
+    (ингредиент -> изменение количества)
+    '''
+    user_ids = list(user_ids)
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic():
+        ShoppingListIngredient.objects.bulk_create(
+            (ShoppingListIngredient(user_id=user_id, ingredient_id=pk)
+             for user_id in user_ids for pk in deltas),
+            ignore_conflicts=True)
+        for pk, delta in deltas.items():
+            ShoppingListIngredient.objects.filter(
+                user_id__in=user_ids, ingredient_id=pk
+            ).update(amount=F('amount') + delta)
+        ShoppingListIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas, amount__lte=0
+        ).delete()
+
+
+def add_recipe(user_id, recipe):
+    '''Добавляет ингредиенты рецепта в список покупок пользователя'''
+
+    apply_deltas((user_id,), get_recipe_amounts(recipe))
+
+
+def remove_recipe(user_id, recipe):
+    '''Убирает ингредиенты рецепта из списка покупок пользователя'''
+
+    apply_deltas((user_id,), {
+        pk: -amount for pk, amount in get_recipe_amounts(recipe).items()})
+
+
+def update_recipe(recipe, old_amounts, new_amounts=None):
+    '''
+    Применяет изменение ингредиентов рецепта к спискам покупок
+    всех пользователей, у которых он в корзине
+    '''
+    if new_amounts is None:
+        new_amounts = get_recipe_amounts(recipe)
+    deltas = {pk: new_amounts[pk] - old_amounts[pk]
+              for pk in new_amounts.keys() | old_amounts.keys()}
+    apply_deltas(ShoppingCart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True), deltas)
+
+
+@contextmanager
+def track_recipe_changes(recipe_ids):
+    '''
+    Применяет к спискам покупок изменение ингредиентов рецептов,
+    выполненное внутри блока with
+    '''
+    with transaction.atomic():
+        old_amounts = {pk: get_recipe_amounts(pk) for pk in recipe_ids}
+        yield
+        for pk, amounts in old_amounts.items():
+            update_recipe(pk, amounts)
+
+
+def calculate_shopping_lists(user_ids=None):
+    '''
+    Вычисляет списки покупок по корзинам.
+    Возвращает словарь (пользователь, ингредиент) -> количество
+    '''
+    queryset = ShoppingCart.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in queryset.values_list(
+            'user_id', 'recipe__recipe_ingredients__ingredient_id'
+        ).annotate(
+            amount=Sum('recipe__recipe_ingredients__amount')
+        ).order_by().iterator()
+        if ingredient_id is not None
+    }
+
+
+def rebuild_shopping_lists(fix=True):
+    '''
+    Сверяет сохраненные списки покупок с корзинами и при fix
+    исправляет расхождения. Возвращает количество расхождений
+    '''
+    with transaction.atomic():
+        expected = calculate_shopping_lists()
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingListIngredient.objects.select_for_update().values_list(
+                'user_id', 'ingredient_id', 'amount').iterator()
+        }
+        stale = stored.keys() - expected.keys()
+        changed = {key: amount for key, amount in expected.items()
+                   if stored.get(key) != amount}
+        if fix:
+            for user_id, ingredient_id in stale:
+                ShoppingListIngredient.objects.filter(
+                    user_id=user_id, ingredient_id=ingredient_id).delete()
+            for (user_id, ingredient_id), amount in changed.items():
+                ShoppingListIngredient.objects.update_or_create(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    defaults={'amount': amount})
+    return len(stale) + len(changed)
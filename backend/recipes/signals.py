@@ -0,0 +1,194 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Subscribe
+
+from .ingredient_catalog import export_catalog
+from .count_cache import bump_recipes_version, bump_user_lists_version
+from .counters import count_deleted, count_saved, remember_target
+from .images import schedule_variants
+from .ingredient_index import rebuild_index
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                     RecipeTags, ShoppingCart)
+from .pantry_index import recipe_changed
+from .shopping_list import add_recipe, remove_recipe
+
+User = get_user_model()
+
+
+def rebuild_ingredient_catalog(connection):
+    '''
+    Перестраивает индекс и выгрузку каталога ингредиентов, если
+    изменения еще не учтены другим обработчиком этой транзакции
+    '''
+    if getattr(connection, 'ingredient_catalog_changed', False):
+        connection.ingredient_catalog_changed = False
+        rebuild_index()
+        export_catalog()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    '''
+    Перестраивает индекс и выгрузку каталога ингредиентов
+    после фиксации транзакции. Изменение помечается флагом
+    соединения, поэтому при изменении многих ингредиентов
+    в одной транзакции перестройка выполняется один раз.
+    Флаг, оставшийся после отката, приводит к перестройке
+    при следующей фиксации
+    '''
+    connection = transaction.get_connection()
+    connection.ingredient_catalog_changed = True
+    transaction.on_commit(partial(rebuild_ingredient_catalog, connection))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    '''Добавляет ингредиенты рецепта в список покупок пользователя'''
+
+    if created:
+        add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    '''
+    Убирает ингредиенты рецепта из списка покупок пользователя.
+    Выполняется до удаления, пока ингредиенты рецепта еще доступны,
+    в том числе при каскадном удалении рецепта
+    '''
+    remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    '''Создает уменьшенные копии изображения рецепта в фоне'''
+
+    name = instance.image.name
+    transaction.on_commit(lambda: schedule_variants(name))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    '''Создает уменьшенные копии аватара пользователя в фоне'''
+
+    name = instance.avatar.name
+    if name:
+        transaction.on_commit(lambda: schedule_variants(name))
+
+
+@receiver((post_save, post_delete), sender=RecipeTags)
+def recipe_tags_changed(sender, instance, **kwargs):
+    '''Пересчитывает битовую маску тегов рецепта'''
+
+    Recipe(pk=instance.recipe_id).update_tags_mask()
+
+
+@receiver(m2m_changed, sender=RecipeTags)
+def recipe_tags_set(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    Пересчитывает битовые маски тегов рецептов после изменения
+    связи рецептов и тегов через менеджер многие-ко-многим
+    '''
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.update_tags_mask()
+    elif pk_set:
+        for recipe in Recipe.objects.filter(pk__in=pk_set):
+            recipe.update_tags_mask()
+    else:
+        for recipe in Recipe.objects.filter(tags_mask__gt=0):
+            recipe.update_tags_mask()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeTags)
+@receiver(m2m_changed, sender=RecipeTags)
+def recipes_changed(sender, **kwargs):
+    '''Сбрасывает кэшированные счетчики рецептов'''
+
+    bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def user_lists_changed(sender, instance, **kwargs):
+    '''Сбрасывает кэшированные счетчики списков пользователя'''
+
+    bump_user_lists_version(instance.user_id)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Subscribe)
+def counted_saving(sender, instance, update_fields=None, **kwargs):
+    '''Запоминает прежнего владельца записи для переноса счетчика'''
+
+    remember_target(instance, update_fields)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscribe)
+def counted_saved(sender, instance, created, **kwargs):
+    '''
+    Увеличивает счетчики избранного, списка покупок, рецептов
+    автора и подписчиков при создании записи
+    '''
+    count_saved(instance, created)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscribe)
+def counted_deleted(sender, instance, **kwargs):
+    '''Уменьшает счетчики при удалении записи'''
+
+    count_deleted(instance)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_written(sender, instance, **kwargs):
+    '''Обновляет индекс рецептов по ингредиентам'''
+
+    recipe_changed(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredients)
+def recipe_ingredient_written(sender, instance, **kwargs):
+    '''
+    Обновляет индекс рецептов по ингредиентам при изменении
+    ингредиентов через админку
+    '''
+    recipe_changed(instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredients)
+@receiver((post_save, post_delete), sender=RecipeTags)
+def recipe_composition_written(sender, instance, **kwargs):
+    '''
+    Обновляет дату изменения рецепта, по которой пересчитываются
+    похожие рецепты
+    '''
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        modified=timezone.now())
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    '''
+    Помечает для пересчета рецепты, в списке похожих у которых
+    есть удаляемый рецепт
+    '''
+    Recipe.objects.filter(similar_recipes__similar=instance).update(
+        similar_computed=None)
@@ -0,0 +1,175 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from scipy import sparse
+
+from .constants import (SIMILARITY_CANDIDATES, SIMILARITY_CHUNK_SIZE,
+                        SIMILARITY_MAX_PRODUCTS, SIMILARITY_MAX_SHARE,
+                        SIMILARITY_MIN_FEATURE_LIMIT, SIMILARITY_TAG_WEIGHT,
+                        SIMILARITY_TOP_K)
+from .models import Recipe, RecipeIngredients, RecipeTags, SimilarRecipe
+
+
+def build_matrix(recipe_ids, queryset, field, max_share=None):
+    '''
+    Строит разреженную бинарную матрицу рецепт x признак по парам
+    (recipe_id, field) и нормирует строки, чтобы произведение строк
+    было косинусной мерой. Признаки, встречающиеся больше чем
+    в max_share рецептов, отбрасываются
+    '''
+    pairs = np.fromiter(
+        (value for row in queryset.values_list(
+            'recipe_id', field).iterator() for value in row),
+        dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == pairs[known, 0]
+    features, columns = np.unique(pairs[known, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.float32), (rows[known], columns)),
+        shape=(len(recipe_ids), len(features)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    if max_share is not None:
+        counts = np.bincount(matrix.indices, minlength=len(features))
+        limit = max(max_share * len(recipe_ids), SIMILARITY_MIN_FEATURE_LIMIT)
+        matrix = matrix[:, counts <= limit]
+    norms = np.sqrt(np.diff(matrix.indptr)).astype(np.float32)
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def select_top(columns, data, limit):
+    '''Оставляет limit пар (номер столбца, значение) с наибольшим значением'''
+
+    if len(data) > limit:
+        best = np.argpartition(-data, limit)[:limit]
+        columns, data = columns[best], data[best]
+    return columns, data
+
+
+def iter_chunks(ingredients, transposed, targets, chunk_size):
+    '''
+    Делит строки targets на блоки не больше chunk_size строк так,
+    чтобы число попарных произведений при умножении блока на
+    transposed не превышало SIMILARITY_MAX_PRODUCTS. Это число
+    ограничивает сверху размер матрицы похожести блока
+    '''
+    counts = np.diff(transposed.indptr)
+    costs = np.asarray(sparse.csr_matrix(
+        (counts[ingredients.indices], ingredients.indices, ingredients.indptr),
+        shape=ingredients.shape)[targets].sum(axis=1)).ravel()
+    start = total = 0
+    for index, cost in enumerate(costs):
+        if index > start and (index - start >= chunk_size
+                              or total + cost > SIMILARITY_MAX_PRODUCTS):
+            yield targets[start:index]
+            start = index
+            total = 0
+        total += cost
+    if start < len(targets):
+        yield targets[start:]
+
+
+def get_scores(ingredients, transposed, tags, rows, candidates):
+    '''
+    Возвращает разреженную матрицу похожести строк rows с кандидатами.
+    Кандидаты — candidates рецептов с наибольшей похожестью
+    по ингредиентам, кроме самого рецепта. Только для них к похожести
+    по ингредиентам добавляется похожесть по тегам с весом
+    SIMILARITY_TAG_WEIGHT
+    '''
+    scores = ingredients[rows].dot(transposed).tocsr()
+    pair_rows, pair_columns, pair_data = [], [], []
+    for index, row in enumerate(rows):
+        start, end = scores.indptr[index], scores.indptr[index + 1]
+        columns = scores.indices[start:end]
+        data = scores.data[start:end]
+        keep = columns != row
+        columns, data = select_top(columns[keep], data[keep], candidates)
+        pair_rows.append(np.full(len(columns), index))
+        pair_columns.append(columns)
+        pair_data.append(data)
+    del scores
+    pair_rows = np.concatenate(pair_rows)
+    pair_columns = np.concatenate(pair_columns)
+    tag_scores = np.asarray(tags[rows[pair_rows]].multiply(
+        tags[pair_columns]).sum(axis=1)).ravel()
+    data = ((1 - SIMILARITY_TAG_WEIGHT) * np.concatenate(pair_data)
+            + SIMILARITY_TAG_WEIGHT * tag_scores)
+    return sparse.csr_matrix((data, (pair_rows, pair_columns)),
+                             shape=(len(rows), ingredients.shape[0]))
+
+
+def top_neighbours(scores, rows, top_k):
+    '''
+    Возвращает для каждой строки блока пары (номер соседа, похожесть)
+    с наибольшей похожестью
+    '''
+    for index, row in enumerate(rows):
+        start, end = scores.indptr[index], scores.indptr[index + 1]
+        columns, data = select_top(scores.indices[start:end],
+                                   scores.data[start:end], top_k)
+        order = np.argsort(-data, kind='stable')
+        yield row, columns[order], data[order]
+
+
+def get_changed_recipe_ids():
+    '''
+    Возвращает id рецептов, измененных после последнего расчета
+    или еще не рассчитанных, а также рецептов, у которых такие
+    рецепты есть в списке похожих
+    '''
+    changed = Recipe.objects.filter(
+        Q(similar_computed__isnull=True)
+        | Q(modified__gt=F('similar_computed'))).values('id')
+    return list(Recipe.objects.filter(
+        Q(id__in=changed) | Q(similar_recipes__similar__in=changed)
+    ).distinct().values_list('id', flat=True))
+
+
+def build_similar_recipes(incremental=False, top_k=SIMILARITY_TOP_K,
+                          chunk_size=SIMILARITY_CHUNK_SIZE):
+    '''
+    Рассчитывает похожие рецепты и сохраняет top_k соседей каждого.
+    Похожесть считается блоками не больше chunk_size строк и
+    SIMILARITY_MAX_PRODUCTS попарных произведений, поэтому память
+    на блок не растет с числом рецептов. Самые частые ингредиенты
+    (соль, вода) отбрасываются и не порождают кандидатов.
+    В инкрементальном режиме пересчитываются только рецепты,
+    измененные после прошлого расчета, и рецепты, ссылающиеся
+    на них. Возвращает количество пересчитанных рецептов
+    '''
+    computed = timezone.now()
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True).iterator(),
+        dtype=np.int64)
+    if incremental:
+        targets = np.searchsorted(recipe_ids, np.array(
+            sorted(get_changed_recipe_ids()), dtype=np.int64))
+    else:
+        targets = np.arange(len(recipe_ids))
+    if not len(targets):
+        return 0
+    ingredients = build_matrix(
+        recipe_ids, RecipeIngredients.objects.all(), 'ingredient_id',
+        SIMILARITY_MAX_SHARE)
+    transposed = ingredients.T.tocsr()
+    tags = build_matrix(recipe_ids, RecipeTags.objects.all(), 'tag_id')
+
+    for rows in iter_chunks(ingredients, transposed, targets, chunk_size):
+        scores = get_scores(ingredients, transposed, tags, rows,
+                            max(top_k, SIMILARITY_CANDIDATES))
+        chunk_ids = recipe_ids[rows].tolist()
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=chunk_ids).delete()
+            SimilarRecipe.objects.bulk_create(
+                SimilarRecipe(recipe_id=int(recipe_ids[row]),
+                              similar_id=int(recipe_ids[column]),
+                              score=float(score), computed=computed)
+                for row, columns, data in top_neighbours(scores, rows, top_k)
+                for column, score in zip(columns, data))
+            Recipe.objects.filter(id__in=chunk_ids).update(
+                similar_computed=computed)
+    return len(targets)
@@ -0,0 +1,267 @@
+import csv
+import os
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from users.models import User
+from .images import get_variant_url, log_failure, serve_variant
+from .ingredient_index import IngredientIndex, build_index
+from .models import (Ingredient, Recipe, RecipeIngredients, ShoppingCart,
+                     ShoppingListIngredient, SimilarRecipe)
+from .pantry_index import PantryIndex
+from .shopping_list import rebuild_shopping_lists
+from .similarity import build_similar_recipes
+
+
+@mock.patch('recipes.signals.export_catalog')
+@mock.patch('recipes.signals.rebuild_index')
+class IngredientCatalogRebuildTest(TestCase):
+    '''Проверяет перестройку каталога после изменения ингредиентов'''
+
+    def test_one_rebuild_per_transaction(self, rebuild_index, export_catalog):
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'ingredient{index}', measurement_unit='г')
+                for index in range(5))
+            for ingredient in Ingredient.objects.all():
+                ingredient.save()
+            Ingredient.objects.all().delete()
+        rebuild_index.assert_called_once_with()
+        export_catalog.assert_called_once_with()
+
+    def test_rebuild_after_rolled_back_savepoint(self, rebuild_index,
+                                                 export_catalog):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Ingredient.objects.create(name='соль',
+                                              measurement_unit='г')
+                    raise ValueError
+            except ValueError:
+                pass
+            Ingredient.objects.create(name='сахар', measurement_unit='г')
+        rebuild_index.assert_called_once_with()
+
+    def test_rebuild_in_each_transaction(self, rebuild_index,
+                                         export_catalog):
+        for name in ('соль', 'сахар'):
+            with self.captureOnCommitCallbacks(execute=True):
+                Ingredient.objects.create(name=name, measurement_unit='г')
+        self.assertEqual(rebuild_index.call_count, 2)
+
+
+class RecipeIngredientsAdminTest(TestCase):
+    '''
+    Проверяет, что изменение ингредиентов рецептов через админку
+    обновляет списки покупок
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password',
+            first_name='Admin', last_name='Test')
+        cls.milk = Ingredient.objects.create(name='молоко',
+                                             measurement_unit='мл')
+        cls.flour = Ingredient.objects.create(name='мука',
+                                              measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.admin, name='блины', image='recipe_images/test.png',
+            text='text', cooking_time=10)
+        cls.row = RecipeIngredients.objects.create(
+            recipe=cls.recipe, ingredient=cls.milk, amount=10)
+        ShoppingCart.objects.create(user=cls.admin, recipe=cls.recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def get_amounts(self):
+        return dict(ShoppingListIngredient.objects.filter(
+            user=self.admin).values_list('ingredient__name', 'amount'))
+
+    def test_add(self):
+        self.client.post('/admin/recipes/recipeingredients/add/', {
+            'recipe': self.recipe.id, 'ingredient': self.flour.id,
+            'amount': 100})
+        self.assertEqual(self.get_amounts(), {'молоко': 10, 'мука': 100})
+        self.assertEqual(rebuild_shopping_lists(fix=False), 0)
+
+    def test_change(self):
+        self.client.post(
+            f'/admin/recipes/recipeingredients/{self.row.id}/change/', {
+                'recipe': self.recipe.id, 'ingredient': self.milk.id,
+                'amount': 110})
+        self.assertEqual(self.get_amounts(), {'молоко': 110})
+        self.assertEqual(rebuild_shopping_lists(fix=False), 0)
+
+    def test_delete_selected(self):
+        self.client.post('/admin/recipes/recipeingredients/', {
+            'action': 'delete_selected', '_selected_action': [self.row.id],
+            'post': 'yes'})
+        self.assertEqual(self.get_amounts(), {})
+        self.assertEqual(rebuild_shopping_lists(fix=False), 0)
+
+
+class PantryIndexTest(TestCase):
+    '''Проверяет подбор рецептов по имеющимся ингредиентам'''
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Author', last_name='Test')
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{index}',
+                                      measurement_unit='г')
+            for index in range(6)
+        ]
+        self.recipes = [self.create_recipe(positions)
+                        for positions in ((0, 1, 2), (3,), (4, 5))]
+
+    def create_recipe(self, positions):
+        recipe = Recipe.objects.create(
+            author=self.author, name='recipe', image='recipe_images/test.png',
+            text='text', cooking_time=10)
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe,
+                              ingredient=self.ingredients[index], amount=1)
+            for index in positions)
+        return recipe.id
+
+    def test_ingredients_without_overlap(self):
+        matches = PantryIndex().match(
+            [self.ingredients[index].id for index in (0, 3, 4)])
+        first, second, third = self.recipes
+        self.assertEqual(matches.count(), 3)
+        self.assertEqual(list(matches[0:10]), [
+            (second, 1, 0), (third, 1, 1), (first, 1, 2)])
+
+    def test_more_matched_first(self):
+        fourth = self.create_recipe((0, 1, 2, 3, 5))
+        matches = PantryIndex().match(
+            [self.ingredients[index].id for index in (0, 1, 3, 4)])
+        first, second, third = self.recipes
+        self.assertEqual(matches.count(), 4)
+        self.assertEqual(list(matches[0:10]), [
+            (second, 1, 0), (fourth, 3, 2), (first, 2, 1), (third, 1, 1)])
+
+
+class SimilarRecipesTest(TestCase):
+    '''
+    Проверяет инкрементальный расчет похожих рецептов: пересчитываются
+    измененные рецепты и рецепты, которые на них ссылаются
+    '''
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Author', last_name='Test')
+        ingredients = [
+            Ingredient.objects.create(name=f'ingredient{index}',
+                                      measurement_unit='г')
+            for index in range(4)
+        ]
+        self.recipes = []
+        for positions in ((0, 1), (0, 1, 2), (3,)):
+            recipe = Recipe.objects.create(
+                author=author, name='recipe', image='recipe_images/test.png',
+                text='text', cooking_time=10)
+            for index in positions:
+                RecipeIngredients.objects.create(
+                    recipe=recipe, ingredient=ingredients[index], amount=1)
+            self.recipes.append(recipe)
+        self.assertEqual(build_similar_recipes(), 3)
+
+    def test_without_changes(self):
+        self.assertFalse(SimilarRecipe.objects.filter(
+            recipe=self.recipes[2]).exists())
+        self.assertEqual(build_similar_recipes(incremental=True), 0)
+
+    def test_changed_neighbour(self):
+        self.recipes[0].save()
+        self.assertEqual(build_similar_recipes(incremental=True), 2)
+        self.assertEqual(build_similar_recipes(incremental=True), 0)
+
+    def test_deleted_neighbour(self):
+        self.recipes[0].delete()
+        self.assertEqual(build_similar_recipes(incremental=True), 1)
+
+
+class IngredientFuzzySearchTest(SimpleTestCase):
+    '''Проверяет поиск ингредиентов с опечатками по всему каталогу'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'ingredients.idx')
+        with open(settings.BASE_DIR / 'data' / 'ingredients.csv',
+                  encoding='utf-8') as file:
+            ingredients = [(pk, name, unit) for pk, (name, unit)
+                           in enumerate(csv.reader(file), 1)]
+        build_index(ingredients, path)
+        cls.index = IngredientIndex(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_misspelled_milk(self):
+        results = self.index.fuzzy_search('малако')
+        self.assertEqual(results[0]['name'], 'молоко')
+
+
+class ImageVariantsTest(SimpleTestCase):
+    '''
+    Проверяет адреса уменьшенных копий изображений: формат выбирается
+    по заголовку Accept запроса самого изображения
+    '''
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = os.path.join(directory.name, 'variants', 'recipe_images')
+        os.makedirs(self.root)
+
+    def write_variant(self, image_format):
+        with open(os.path.join(self.root, f'test.medium.{image_format}'),
+                  'w') as file:
+            file.write(image_format)
+
+    def test_url_without_format(self):
+        self.write_variant('webp')
+        self.assertIsNone(get_variant_url('recipe_images/test.png', 'medium'))
+        self.write_variant('jpeg')
+        self.assertEqual(get_variant_url('recipe_images/test.png', 'medium'),
+                         '/media/variants/recipe_images/test.medium')
+
+    def test_serve_by_accept(self):
+        self.write_variant('webp')
+        self.write_variant('jpeg')
+        factory = RequestFactory()
+        for accept, content in (('image/avif,image/webp,*/*', b'webp'),
+                                ('image/png,image/*;q=0.8', b'jpeg')):
+            with self.subTest(accept=accept):
+                response = serve_variant(
+                    factory.get('/', HTTP_ACCEPT=accept),
+                    'recipe_images/test.medium')
+                self.assertEqual(b''.join(response.streaming_content),
+                                 content)
+                self.assertEqual(response['Vary'], 'Accept')
+
+    def test_failure_logged(self):
+        future = Future()
+        future.set_exception(OSError('broken image'))
+        with self.assertLogs('recipes.images', 'ERROR'):
+            log_failure('recipe_images/test.png', future)
@@ -3,6 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
 from rest_framework.authtoken.admin import TokenProxy
 
+from .constants import ADMIN_LIST_PER_PAGE
 from .models import Subscribe, User
 from .forms import AdminAuthenticationForm
 
@@ -18,6 +19,8 @@ class MyUserAdmin(UserAdmin):
         'username', 'email', 'first_name', 'last_name'
     )
     search_fields = ('email', 'username')
+    list_per_page = ADMIN_LIST_PER_PAGE
+    show_full_result_count = False
 
 
 @admin.register(Subscribe)
@@ -27,9 +30,9 @@ class SubscribeAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'user', 'author'
     )
-    list_editable = (
-        'user', 'author',
-    )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    list_per_page = ADMIN_LIST_PER_PAGE
 
 
 admin.site.unregister(Group)
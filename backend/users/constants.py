@@ -1 +1,3 @@
 MAX_EMAIL_VALUE = 254
+USER_COUNTERS = ('recipes_count', 'followers_count')
+ADMIN_LIST_PER_PAGE = 50
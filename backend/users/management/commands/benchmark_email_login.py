@@ -0,0 +1,69 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from foodgram.authentication import EmailBackend
+from users.models import User, normalize_email
+
+SEED_PREFIX = 'bench_login_'
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = ('Measure email login latency while growing the user table '
+            'with synthetic users')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=(10_000, 100_000, 1_000_000))
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete synthetic users afterwards')
+
+    def seed(self, size, password):
+        existing = User.objects.filter(
+            username__startswith=SEED_PREFIX).count()
+        User.objects.bulk_create(
+            (User(username=f'{SEED_PREFIX}{i}',
+                  email=f'{SEED_PREFIX}{i}@example.com', password=password)
+             for i in range(existing, size)), batch_size=10_000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE users_user')
+
+    def measure(self, size, repeat):
+        emails = [f' {SEED_PREFIX.upper()}{random.randrange(size)}'
+                  '@Example.com' for _ in range(repeat)]
+        timings = []
+        for email in emails:
+            start = time.perf_counter()
+            User.objects.get(email=normalize_email(email))
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings
+
+    def handle(self, *args, **options):
+        password = make_password(PASSWORD)
+        backend = EmailBackend()
+        for size in sorted(options['sizes']):
+            self.seed(size, password)
+            timings = self.measure(size, options['repeat'])
+            start = time.perf_counter()
+            user = backend.authenticate(
+                None, username=f'{SEED_PREFIX}0@EXAMPLE.COM',
+                password=PASSWORD)
+            login = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f'users: {size}, lookup p50: '
+                f'{statistics.median(timings):.3f} ms, '
+                f'p95: {timings[int(len(timings) * 0.95)]:.3f} ms, '
+                f'full login with password check: {login:.1f} ms '
+                f'({"ok" if user else "failed"})')
+        self.stdout.write(User.objects.filter(
+            email=normalize_email(f'{SEED_PREFIX}0@example.com')).explain())
+        if options['cleanup']:
+            User.objects.filter(username__startswith=SEED_PREFIX).delete()
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_subscribe_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['user', 'author'], name='subscribe_user_author_idx'),
+        ),
+    ]
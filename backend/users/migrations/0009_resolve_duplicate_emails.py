@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-18 02:33
+
+from django.db import migrations
+from django.db.models import Count, F
+from django.db.models.functions import Lower, Trim
+
+MAX_EMAIL_VALUE = 254
+
+
+def get_duplicate_email(User, user, email):
+    local, _, domain = email.rpartition('@')
+    if not local:
+        local, domain = domain or 'user', 'invalid'
+    suffix = f'+duplicate{user.pk}@{domain}'
+    candidate = local[:MAX_EMAIL_VALUE - len(suffix)] + suffix
+    while User.objects.filter(email__iexact=candidate).exists():
+        candidate = f'x{candidate}'[:MAX_EMAIL_VALUE]
+    return candidate
+
+
+def resolve_duplicate_emails(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    duplicates = User.objects.annotate(
+        normalized=Lower(Trim('email'))
+    ).order_by().values('normalized').annotate(
+        total=Count('id')
+    ).filter(total__gt=1).values_list('normalized', flat=True)
+    for email in list(duplicates):
+        users = User.objects.annotate(
+            normalized=Lower(Trim('email'))
+        ).filter(normalized=email).order_by(
+            F('last_login').desc(nulls_last=True), 'id')
+        for user in list(users)[1:]:
+            user.email = get_duplicate_email(User, user, email)
+            user.save(update_fields=('email',))
+    User.objects.exclude(email=Lower(Trim('email'))).update(
+        email=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicate_emails,
+                             migrations.RunPython.noop),
+    ]
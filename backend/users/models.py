@@ -1,14 +1,27 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-from .constants import MAX_EMAIL_VALUE
+from .constants import MAX_EMAIL_VALUE, USER_COUNTERS
+
+
+def normalize_email(email):
+    '''
+    Приводит адрес почты к виду, в котором он хранится:
+    без пробелов по краям и в нижнем регистре
+    '''
+    return email.strip().lower() if email else email
 
 
 class User(AbstractUser):
     '''Модель для представления пользователя'''
 
-    email = models.EmailField('электронная почта', max_length=MAX_EMAIL_VALUE)
+    email = models.EmailField('электронная почта', max_length=MAX_EMAIL_VALUE,
+                              unique=True)
     avatar = models.ImageField('аватар', upload_to='users_avatars', blank=True)
+    recipes_count = models.PositiveIntegerField(
+        'количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'количество подписчиков', default=0, editable=False)
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -18,6 +31,20 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        '''
+        Сохраняет объект с нормализованной почтой, не перезаписывая
+        счетчики: они изменяются только атомарными обновлениями
+        '''
+        self.email = normalize_email(self.email)
+        if not (self._state.adding or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in USER_COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Subscribe(models.Model):
     '''Модель для представления подписок'''
@@ -32,6 +59,10 @@ class Subscribe(models.Model):
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+        indexes = (
+            models.Index(fields=('user', 'author'),
+                         name='subscribe_user_author_idx'),
+        )
 
     def __str__(self):
         return f'{self.user}, {self.author}'
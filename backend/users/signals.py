@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram.authentication import invalidate_user_tokens, token_cache
+
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    '''
+    Отзывает закэшированные токены пользователя после сохранения:
+    смены пароля, деактивации или изменения профиля
+    '''
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    '''Отзывает закэшированный токен при выходе из системы'''
+
+    token_cache.invalidate(instance.key)